@@ -1,12 +1,12 @@
-from fastapi import FastAPI, Security, HTTPException, Depends, status, requests, Request
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi import FastAPI, Security, HTTPException, Depends, status, requests, Request, Header, Response, Form, File, UploadFile, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import APIKeyHeader
 from typing import Optional, Dict, List
 from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
-import os, glueops.setup_logging, traceback, base64, yaml, tempfile, json
-from schemas.schemas import Message, AwsCredentialsRequest, StorageBucketsRequest, AwsNukeAccountRequest, CaptainDomainNukeDataAndBackupsRequest, ChiselNodesRequest, ChiselNodesDeleteRequest, K3dLbNodesRequest, K3dLbNodesDeleteRequest, ResetGitHubOrganizationRequest, OpsgenieAlertsManifestRequest, IncidentioAlertsManifestRequest, CaptainManifestsRequest, KubeApiserverManifestRequest, KubeRbacManifestRequest, GitHubWorkflowRunStatusRequest, VersionResponse
-from util import storage, aws_setup_test_account_credentials, github, hetzner, k3d_lb, opsgenie, incidentio, captain_manifests, kube_apiserver, kube_rbac
+import os, glueops.setup_logging, traceback, base64, yaml, tempfile, json, asyncio
+from schemas.schemas import Message, AwsCredentialsRequest, StorageBucketsRequest, AwsNukeAccountRequest, CaptainDomainNukeDataAndBackupsRequest, ChiselNodesRequest, ChiselNodesDeleteRequest, K3dLbNodesRequest, K3dLbNodesDeleteRequest, ResetGitHubOrganizationRequest, OpsgenieAlertsManifestRequest, IncidentioAlertsManifestRequest, CaptainManifestsRequest, KubeApiserverManifestRequest, KubeRbacManifestRequest, GitHubWorkflowRunStatusRequest, VersionResponse, BulkManifestsRequest, JobStatusResponse, BatchRequest, BatchResponse, TeardownRequest, TeardownResponse
+from util import storage, aws_setup_test_account_credentials, github, hetzner, k3d_lb, opsgenie, incidentio, captain_manifests, kube_apiserver, kube_rbac, bulk_manifests, etag, progress, metrics, single_flight, jobs, batch, teardown, domain_locks
 from fastapi.responses import RedirectResponse
 
 
@@ -15,17 +15,37 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 logger = glueops.setup_logging.configure(level=LOG_LEVEL)
 
 
+APP_VERSION = os.getenv("VERSION", "UNKNOWN")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    k3d_lb.start_background_tasks()
+    yield
+    await k3d_lb.stop_background_tasks()
+
+
 app = FastAPI(
     title="Tools API",
     description="Various APIs to help you speed up your development and testing.",
-    version=os.getenv("VERSION", "UNKNOWN"),
-    swagger_ui_parameters={"defaultModelsExpandDepth": -1}
+    version=APP_VERSION,
+    swagger_ui_parameters={"defaultModelsExpandDepth": -1},
+    lifespan=lifespan,
 )
 
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/docs")
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Summarize the phases timed while handling the request (see util.metrics) in Server-Timing."""
+    timings = metrics.start_request()
+    response = await call_next(request)
+    if timings:
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return response
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     # Extract the full stack trace
@@ -44,22 +64,66 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
+def conditional_manifest(request, if_none_match, render, parse=None):
+    """Serve a deterministic manifest with an ETag; a matching If-None-Match returns 304 without rendering.
+
+    parse(request), if given, validates and normalizes the body first, so an invalid body is
+    rejected (422) even when its ETag matches; the tag is then computed over what it returns,
+    and render gets that instead of the request. Returning 304 to a POST deviates from RFC 9110
+    section 13.1.2, which asks for 412 on non-GET/HEAD methods; it is deliberate, as these POSTs
+    are side-effect free reads and 304 is what lets reconcilers keep their cached copy.
+    """
+    parsed = request if parse is None else parse(request)
+    tag = etag.compute_etag(request, APP_VERSION, None if parse is None else parsed)
+    if etag.if_none_match_matches(if_none_match, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    return PlainTextResponse(render(parsed), headers={"ETag": tag})
+
+
+STREAM_QUERY = Query(default=None, description="Stream per-node progress events as 'ndjson' or 'sse' (also selected by an Accept of application/x-ndjson or text/event-stream); the chisel manifest is the final event.")
+
+
+def progress_response(fmt, run):
+    """Stream run(emit)'s progress events and its final manifest (see util.progress)."""
+    return StreamingResponse(progress.stream(fmt, run), media_type=progress.FORMATS[fmt], headers={"Cache-Control": "no-cache"})
+
+
+PREFER_HEADER = Header(default=None, description="Send 'respond-async' to get 202 with a job id at once instead of waiting; poll GET /v1/jobs/{id} for the result.")
+
+
+async def respond(kind, run, fmt=None, prefer=None):
+    """Serve run(emit) as a background job (Prefer: respond-async), a progress stream (fmt), or inline."""
+    if jobs.requested(prefer):
+        job = await jobs.submit(kind, run)
+        return JSONResponse(status_code=202, content=job, headers={"Location": f"/v1/jobs/{job['id']}"})
+    if fmt:
+        return progress_response(fmt, run)
+    return await run(None)
+
+
+IDEMPOTENCY_KEY_HEADER = Header(default=None, description="Retries with the same key get the first request's result instead of re-provisioning. Identical concurrent requests are coalesced even without one.")
+
+
 @app.post("/v1/storage-buckets", response_class=PlainTextResponse, summary="Create/Re-create storage buckets that can be used for V2 of our monitoring stack that is Otel based")
-async def hello(request: StorageBucketsRequest):
+async def hello(request: StorageBucketsRequest, idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER, prefer: Optional[str] = PREFER_HEADER):
     """
         Note: this can be a DESTRUCTIVE operation
         For the provided captain_domain, this will DELETE and then create new/empty storage buckets for loki, tempo, and thanos.
     """
-    return storage.create_all_buckets(request.captain_domain)
+    return await respond("storage-buckets", lambda emit: single_flight.run(
+        "storage-buckets", request, idempotency_key, lambda: domain_locks.run_in_thread("storage-buckets", request.captain_domain, storage.create_all_buckets, request.captain_domain)
+    ), prefer=prefer)
 
 
 @app.post("/v1/setup-aws-account-credentials", response_class=PlainTextResponse, summary="Whether it's to create an EKS cluster or to test other things out in an isolated AWS account. These creds will give you Admin level access to the requested account.")
-async def create_credentials_for_aws_captain_account(request: AwsCredentialsRequest):
+async def create_credentials_for_aws_captain_account(request: AwsCredentialsRequest, prefer: Optional[str] = PREFER_HEADER):
     """
     If you are testing in AWS/EKS you will need an AWS account to test with. This request will provide you with admin level credentials to the sub account you specify.
     This can also be used to just get Admin access to a desired sub account.
     """
-    return aws_setup_test_account_credentials.create_admin_credentials_within_captain_account(request.aws_sub_account_name)
+    return await respond("setup-aws-account-credentials", lambda emit: asyncio.to_thread(
+        aws_setup_test_account_credentials.create_admin_credentials_within_captain_account, request.aws_sub_account_name
+    ), prefer=prefer)
 
 
 @app.delete("/v1/nuke-aws-captain-account", summary="Run this after you are done testing within AWS. This will clean up orphaned resources. Note: you may have to run this 2x.")
@@ -102,16 +166,26 @@ async def get_workflow_run_status(request: GitHubWorkflowRunStatusRequest):
     return github.get_workflow_run_status(request.run_url)
 
 @app.post("/v1/chisel", response_class=PlainTextResponse, summary="Creates Chisel nodes for dev/k3d clusters. This allows us to mimic a Cloud Controller for Loadbalancers (e.g. NLBs with EKS)")
-async def create_chisel_nodes(request: ChiselNodesRequest):
+async def create_chisel_nodes(request: ChiselNodesRequest, stream: Optional[str] = STREAM_QUERY, accept: Optional[str] = Header(default=None), idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER, prefer: Optional[str] = PREFER_HEADER):
     """
         If you are testing within k3ds you will need chisel to provide you with load balancers.
         For a provided captain_domain this will delete any existing chisel nodes and provision new ones.
         Note: this will generally result in new IPs being provisioned.
     """
     logger.info(f"Received POST request to create chisel nodes for captain_domain: {request.captain_domain}")
-    result = hetzner.create_instances(request)
-    logger.info(f"Successfully completed chisel node creation for captain_domain: {request.captain_domain}")
-    return result
+    # A request that attaches to one already in flight reports only the final manifest.
+    return await respond("chisel", lambda emit: single_flight.run(
+        "chisel", request, idempotency_key, lambda: domain_locks.run_in_thread("chisel", request.captain_domain, hetzner.create_instances, request, emit)
+    ), progress.requested_format(stream, accept), prefer)
+
+
+@app.get("/v1/chisel", response_class=PlainTextResponse, summary="Returns the last chisel manifest generated by POST /v1/chisel, without reprovisioning")
+async def get_chisel_nodes(captain_domain: str = Query(..., examples=['nonprod.foobar.onglueops.rocks'])):
+    """
+        If you lost the output of POST /v1/chisel, this returns it again as long as all of its nodes still exist.
+        Requires RESULT_STORE_PATH/RESULT_STORE_KEY; returns 404 when nothing is stored or the nodes are gone.
+    """
+    return await asyncio.to_thread(hetzner.last_manifest, captain_domain)
 
 
 @app.delete("/v1/chisel", summary="Deletes your chisel nodes. Please run this when you are done with development to save on costs.")
@@ -120,13 +194,14 @@ async def delete_chisel_nodes(request: ChiselNodesDeleteRequest):
         When you are done testing with k3ds this will delete your chisel nodes and save on costs.
     """
     logger.info(f"Received DELETE request to delete chisel nodes for captain_domain: {request.captain_domain}")
-    response = hetzner.delete_existing_servers(request)
+    single_flight.forget("chisel", request.captain_domain)
+    await domain_locks.run_in_thread("chisel", request.captain_domain, hetzner.delete_existing_servers, request)
     logger.info(f"Successfully completed chisel node deletion for captain_domain: {request.captain_domain}")
     return JSONResponse(status_code=200, content={"message": "Successfully deleted chisel nodes."})
 
 
 @app.post("/v1/k3d-lb-nodes", response_class=PlainTextResponse, summary="Creates Chisel nodes on Proxmox (via Waggle placement) for dev/k3d clusters. This allows us to mimic a Cloud Controller for Loadbalancers (e.g. NLBs with EKS)")
-async def create_k3d_lb_nodes(request: K3dLbNodesRequest):
+async def create_k3d_lb_nodes(request: K3dLbNodesRequest, stream: Optional[str] = STREAM_QUERY, accept: Optional[str] = Header(default=None), idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER, prefer: Optional[str] = PREFER_HEADER):
     """
         If you are testing within k3ds you will need chisel to provide you with load balancers.
         For a provided captain_domain this will delete any existing k3d-lb nodes and provision new ones.
@@ -135,9 +210,19 @@ async def create_k3d_lb_nodes(request: K3dLbNodesRequest):
         Note: this will generally result in new IPs being provisioned.
     """
     logger.info(f"Received POST request to create k3d-lb nodes for captain_domain: {request.captain_domain}")
-    result = await k3d_lb.create_nodes(request)
-    logger.info(f"Successfully completed k3d-lb node creation for captain_domain: {request.captain_domain}")
-    return result
+    # A request that attaches to one already in flight reports only the final manifest.
+    return await respond("k3d-lb-nodes", lambda emit: single_flight.run(
+        "k3d-lb-nodes", request, idempotency_key, lambda: k3d_lb.create_nodes(request, progress=emit)
+    ), progress.requested_format(stream, accept), prefer)
+
+
+@app.get("/v1/k3d-lb-nodes", response_class=PlainTextResponse, summary="Returns the last chisel manifest generated by POST /v1/k3d-lb-nodes, without reprovisioning")
+async def get_k3d_lb_nodes(captain_domain: str = Query(..., examples=['nonprod.foobar.onglueops.rocks'])):
+    """
+        If you lost the output of POST /v1/k3d-lb-nodes, this returns it again as long as all of its VMs are still running.
+        Requires RESULT_STORE_PATH/RESULT_STORE_KEY; returns 404 when nothing is stored or the VMs are gone.
+    """
+    return await k3d_lb.last_manifest(captain_domain)
 
 
 @app.delete("/v1/k3d-lb-nodes", summary="Deletes your k3d-lb nodes. Please run this when you are done with development to free up capacity.")
@@ -146,27 +231,47 @@ async def delete_k3d_lb_nodes(request: K3dLbNodesDeleteRequest):
         When you are done testing with k3ds this will delete your k3d-lb nodes (Proxmox VMs + Waggle pool) and free up capacity.
     """
     logger.info(f"Received DELETE request to delete k3d-lb nodes for captain_domain: {request.captain_domain}")
+    single_flight.forget("k3d-lb-nodes", request.captain_domain)
     await k3d_lb.delete_nodes(request.captain_domain)
     logger.info(f"Successfully completed k3d-lb node deletion for captain_domain: {request.captain_domain}")
     return JSONResponse(status_code=200, content={"message": "Successfully deleted k3d-lb nodes."})
 
 
+@app.delete("/v1/teardown", response_model=TeardownResponse, responses={207: {"model": TeardownResponse, "description": "Some steps failed; see steps"}}, summary="Tears down a dev environment: chisel and k3d-lb nodes, storage buckets and captain_domain data, all at once")
+async def teardown_captain_domain(request: TeardownRequest, prefer: Optional[str] = PREFER_HEADER):
+    """
+        Runs DELETE /v1/chisel, DELETE /v1/k3d-lb-nodes, the storage bucket deletion and DELETE /v1/nuke-captain-domain-data
+        for the captain_domain concurrently, so it takes as long as the slowest of them. Every step runs even if another fails;
+        the report lists each step's outcome and comes with a 207 (succeeded: false) when any step failed, 200 otherwise.
+        As a job (Prefer: respond-async), the same report is the job's result either way.
+    """
+    logger.info(f"Received DELETE request to tear down captain_domain: {request.captain_domain} ({', '.join(request.steps)})")
+
+    async def run(emit):
+        report = await teardown.run(request, emit)
+        if emit is not None:
+            return report
+        return JSONResponse(status_code=200 if report["succeeded"] else 207, content=TeardownResponse(**report).model_dump(mode="json"))
+
+    return await respond("teardown", run, prefer=prefer)
+
+
 @app.post("/v1/opsgenie", response_class=PlainTextResponse, summary="Creates Opsgenie Alerts Manifest")
-async def create_opsgeniealerts_manifest(request: OpsgenieAlertsManifestRequest):
+async def create_opsgeniealerts_manifest(request: OpsgenieAlertsManifestRequest, if_none_match: Optional[str] = Header(default=None)):
     """
         Create a opsgenie/alertmanager configuration. Do this for any clusters you want alerts on.
     """
-    return opsgenie.create_opsgeniealerts_manifest(request)
+    return conditional_manifest(request, if_none_match, opsgenie.create_opsgeniealerts_manifest)
 
 @app.post("/v1/incidentio", response_class=PlainTextResponse, summary="Creates Incident.io Alerts Manifest")
-async def create_incidentioalerts_manifest(request: IncidentioAlertsManifestRequest):
+async def create_incidentioalerts_manifest(request: IncidentioAlertsManifestRequest, if_none_match: Optional[str] = Header(default=None)):
     """
         Create an incident.io/alertmanager configuration. Do this for any clusters you want alerts on.
     """
-    return incidentio.create_incidentioalerts_manifest(request)
+    return conditional_manifest(request, if_none_match, incidentio.create_incidentioalerts_manifest)
 
 @app.post("/v1/kube-apiserver", response_class=PlainTextResponse, summary="Generate manifest to expose the cluster kube-apiserver via Traefik (TLS passthrough + IP allowlist)")
-async def create_kube_apiserver_manifest(request: KubeApiserverManifestRequest):
+async def create_kube_apiserver_manifest(request: KubeApiserverManifestRequest, if_none_match: Optional[str] = Header(default=None)):
     """
         Generate the Namespace + Traefik MiddlewareTCP + IngressRouteTCP manifest that
         exposes the cluster's Kubernetes API server at kube-api.<captain_domain>,
@@ -176,10 +281,29 @@ async def create_kube_apiserver_manifest(request: KubeApiserverManifestRequest):
         default namespace from glueops-core-kube-api, so the platform Traefik must have
         providers.kubernetesCRD.allowCrossNamespace=true or the route is silently dropped.
     """
-    return kube_apiserver.create_kube_apiserver_manifest(request)
+    return conditional_manifest(request, if_none_match, lambda parsed: kube_apiserver.render_manifest(*parsed), kube_apiserver.parse_request)
+
+@app.post("/v1/kube-apiserver/allowlist-file", response_class=PlainTextResponse, summary="Same as /v1/kube-apiserver, but the IP allowlist is uploaded as a file (e.g. a cloud provider's published ranges)")
+async def create_kube_apiserver_manifest_from_file(
+    captain_domain: str = Form(..., examples=['nonprod.foobar.onglueops.rocks']),
+    allowed_source_ranges_file: UploadFile = File(..., description='CIDRs separated by newlines, commas, or whitespace; # starts a comment.'),
+    aggregate: bool = Form(default=False),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """
+        Multipart variant of /v1/kube-apiserver for allowlists too large to paste into one string.
+        Set aggregate=true to collapse overlapping/adjacent ranges into the minimal covering set.
+    """
+    try:
+        # One array item per line, so comments and whitespace separators apply (see kube_apiserver._split_ranges).
+        allowed_source_ranges = (await allowed_source_ranges_file.read()).decode("utf-8").splitlines()
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="allowed_source_ranges_file must be UTF-8 text.")
+    request = KubeApiserverManifestRequest(captain_domain=captain_domain, allowed_source_ranges=allowed_source_ranges, aggregate=aggregate)
+    return conditional_manifest(request, if_none_match, lambda parsed: kube_apiserver.render_manifest(*parsed), kube_apiserver.parse_request)
 
 @app.post("/v1/kube-rbac", response_class=PlainTextResponse, summary="Generate developer-debug RBAC (reader/reader-plus/debugger/operator) for a tenant's namespace")
-async def create_kube_rbac_manifest(request: KubeRbacManifestRequest):
+async def create_kube_rbac_manifest(request: KubeRbacManifestRequest, if_none_match: Optional[str] = Header(default=None)):
     """
         Generate the ClusterRoles + namespace-scoped RoleBindings that let a tenant's developers
         debug their workloads (Lens/k9s) in their <environment> namespace via the kube-apiserver
@@ -187,18 +311,46 @@ async def create_kube_rbac_manifest(request: KubeRbacManifestRequest):
         RoleBinding subjects are oidc:<tenant_github_organization_name>:<captain_domain>-kubectl-<role>.
         Also includes the hardcoded glueops-super-admins -> cluster-admin ClusterRoleBinding.
     """
-    return kube_rbac.create_kube_rbac_manifest(request)
+    return conditional_manifest(request, if_none_match, lambda parsed: kube_rbac.render_manifest(*parsed), kube_rbac.parse_request)
 
 @app.post("/v1/captain-manifests", response_class=PlainTextResponse, summary="Generate captain manifests")
-async def create_captain_manifests(request: CaptainManifestsRequest):
+async def create_captain_manifests(request: CaptainManifestsRequest, if_none_match: Optional[str] = Header(default=None)):
     """
         Generate YAML manifests for captain deployments based on the provided configuration.
     """
-    return captain_manifests.generate_manifests(
-        request.captain_domain,
-        request.tenant_github_organization_name,
-        request.tenant_deployment_configurations_repository_name
-    )
+    return conditional_manifest(request, if_none_match, lambda r: captain_manifests.generate_manifests(
+        r.captain_domain,
+        r.tenant_github_organization_name,
+        r.tenant_deployment_configurations_repository_name
+    ))
+
+@app.post("/v1/bulk-manifests", response_class=StreamingResponse, summary="Generate opsgenie/incidentio/kube-apiserver/kube-rbac/captain manifests for many tenants as one multi-document YAML")
+async def create_bulk_manifests(request: BulkManifestsRequest):
+    """
+        Render a list of per-tenant manifest requests in one pass. Each item names its generator and carries
+        the same body as the matching single-tenant endpoint. All items are validated before anything is sent;
+        the YAML is then streamed back as documents are produced, and documents shared across tenants
+        (e.g. the kube-rbac ClusterRoles) are emitted only once.
+    """
+    return StreamingResponse(bulk_manifests.stream_manifests(request.manifests), media_type="application/yaml")
+
+@app.post("/v1/batch", response_model=BatchResponse, summary="Run several operations (storage buckets, k3d-lb/chisel nodes, AWS credentials, manifests) in one request")
+async def run_batch(request: BatchRequest, prefer: Optional[str] = PREFER_HEADER):
+    """
+        Each operation is named after its endpoint and carries that endpoint's request body. Operations start as soon as
+        everything in their depends_on has succeeded, so independent ones run concurrently; an operation whose dependency
+        failed is skipped. Returns each operation's status and result (or error) by id, even when some failed.
+    """
+    batch.validate(request.operations)
+    return await respond("batch", lambda emit: batch.run(request.operations, emit), prefer=prefer)
+
+@app.get("/v1/jobs/{job_id}", response_model=JobStatusResponse, summary="Status, phase, timings and result of a job started with Prefer: respond-async")
+async def get_job(job_id: str):
+    """
+        Poll this after a provisioning endpoint answered 202. Once status is succeeded, result holds what the
+        endpoint would have returned; once failed, error holds its status code and detail.
+    """
+    return await jobs.status(job_id)
 
 @app.get("/health", include_in_schema=False)
 async def health():
@@ -210,10 +362,16 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Phase duration histograms (by hypervisor) in Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/version", response_model=VersionResponse, summary="Contains version information about this tools-api")
 async def version():
     return VersionResponse(
-        version=os.getenv("VERSION", "UNKNOWN"),
+        version=APP_VERSION,
         commit_sha=os.getenv("COMMIT_SHA", "UNKNOWN"),
         short_sha=os.getenv("SHORT_SHA", "UNKNOWN"),
         build_timestamp=os.getenv("BUILD_TIMESTAMP", "UNKNOWN"),
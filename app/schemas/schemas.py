@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Dict
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
 
 class Message(BaseModel):
     message: str = Field(...,example = 'Success')
@@ -33,6 +33,23 @@ class K3dLbNodesRequest(BaseModel):
         example=3,
         description="Number of exit nodes to create (1-6, default: 3)"
     )
+    reconcile: bool = Field(
+        default=False,
+        example=False,
+        description="Keep healthy existing nodes and only add/remove the difference instead of replacing every node"
+    )
+    rotate_credentials: bool = Field(
+        default=False,
+        example=False,
+        description="With reconcile: push fresh chisel credentials to kept nodes in place (otherwise their current credentials are reused)"
+    )
+    quorum: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=6,
+        example=2,
+        description="Return the manifest as soon as this many nodes have IPs (default: all of them). The remaining nodes keep booting in the background and are added to the manifest GET /v1/k3d-lb-nodes returns as their IPs come in (with RESULT_STORE_PATH); a later POST with reconcile=true also returns the full set without rebuilding them"
+    )
 
 class K3dLbNodesDeleteRequest(BaseModel):
     captain_domain: str = Field(..., example='nonprod.foobar.onglueops.rocks')
@@ -87,10 +104,15 @@ class KubeApiserverManifestRequest(BaseModel):
         example='nonprod.foobar.onglueops.rocks',
         description='Drives both the SNI host (kube-api.<captain_domain>) and the external-dns target (platform-v2.<captain_domain>).'
     )
-    allowed_source_ranges: str = Field(
+    allowed_source_ranges: Union[str, List[str]] = Field(
         ...,
         example='192.0.2.10/32,198.51.100.0/24',
-        description='Comma-separated CIDR ranges allowed to reach the kube-apiserver; at least one required. Replace the example (RFC 5737 documentation ranges) with your own IPs.'
+        description='CIDR ranges allowed to reach the kube-apiserver, as a comma-separated string or an array (whose items may hold several comma/whitespace-separated CIDRs and # comments); at least one required. Replace the example (RFC 5737 documentation ranges) with your own IPs.'
+    )
+    aggregate: bool = Field(
+        default=False,
+        example=False,
+        description='Collapse overlapping and adjacent CIDRs (per address family) into the minimal covering set. Useful for large cloud-provider allowlists; the manifest reports the before/after counts.'
     )
 
 class KubeRbacManifestRequest(BaseModel):
@@ -105,6 +127,151 @@ class KubeRbacManifestRequest(BaseModel):
         description='OIDC group prefix: oidc:<org>:<captain_domain>-kubectl-<reader|reader-plus|debugger|operator>.'
     )
 
+class BulkOpsgenieManifest(BaseModel):
+    generator: Literal['opsgenie']
+    input: OpsgenieAlertsManifestRequest
+
+class BulkIncidentioManifest(BaseModel):
+    generator: Literal['incidentio']
+    input: IncidentioAlertsManifestRequest
+
+class BulkKubeApiserverManifest(BaseModel):
+    generator: Literal['kube-apiserver']
+    input: KubeApiserverManifestRequest
+
+class BulkKubeRbacManifest(BaseModel):
+    generator: Literal['kube-rbac']
+    input: KubeRbacManifestRequest
+
+class BulkCaptainManifest(BaseModel):
+    generator: Literal['captain-manifests']
+    input: CaptainManifestsRequest
+
+BulkManifest = Annotated[
+    Union[BulkOpsgenieManifest, BulkIncidentioManifest, BulkKubeApiserverManifest, BulkKubeRbacManifest, BulkCaptainManifest],
+    Field(discriminator='generator'),
+]
+
+class BulkManifestsRequest(BaseModel):
+    manifests: List[BulkManifest] = Field(
+        ...,
+        min_length=1,
+        example=[
+            {'generator': 'kube-rbac', 'input': {'captain_domain': 'nonprod.foobar.onglueops.rocks', 'tenant_github_organization_name': 'development-tenant-foobar'}},
+            {'generator': 'kube-rbac', 'input': {'captain_domain': 'nonprod.bazqux.onglueops.rocks', 'tenant_github_organization_name': 'development-tenant-bazqux'}},
+        ],
+        description='Per-tenant inputs; each item names a generator and carries that endpoint\'s request body.'
+    )
+
+class BatchOperationBase(BaseModel):
+    id: str = Field(..., example='buckets', description='Key of this operation in the result map; referenced by depends_on.')
+    depends_on: List[str] = Field(default_factory=list, example=[], description='ids of operations that must succeed before this one starts.')
+
+class BatchStorageBuckets(BatchOperationBase):
+    operation: Literal['storage-buckets']
+    input: StorageBucketsRequest
+
+class BatchK3dLbNodes(BatchOperationBase):
+    operation: Literal['k3d-lb-nodes']
+    input: K3dLbNodesRequest
+
+class BatchChisel(BatchOperationBase):
+    operation: Literal['chisel']
+    input: ChiselNodesRequest
+
+class BatchAwsCredentials(BatchOperationBase):
+    operation: Literal['setup-aws-account-credentials']
+    input: AwsCredentialsRequest
+
+class BatchOpsgenie(BatchOperationBase):
+    operation: Literal['opsgenie']
+    input: OpsgenieAlertsManifestRequest
+
+class BatchIncidentio(BatchOperationBase):
+    operation: Literal['incidentio']
+    input: IncidentioAlertsManifestRequest
+
+class BatchKubeApiserver(BatchOperationBase):
+    operation: Literal['kube-apiserver']
+    input: KubeApiserverManifestRequest
+
+class BatchKubeRbac(BatchOperationBase):
+    operation: Literal['kube-rbac']
+    input: KubeRbacManifestRequest
+
+class BatchCaptainManifests(BatchOperationBase):
+    operation: Literal['captain-manifests']
+    input: CaptainManifestsRequest
+
+BatchOperation = Annotated[
+    Union[
+        BatchStorageBuckets, BatchK3dLbNodes, BatchChisel, BatchAwsCredentials, BatchOpsgenie,
+        BatchIncidentio, BatchKubeApiserver, BatchKubeRbac, BatchCaptainManifests,
+    ],
+    Field(discriminator='operation'),
+]
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(
+        ...,
+        min_length=1,
+        example=[
+            {'id': 'buckets', 'operation': 'storage-buckets', 'input': {'captain_domain': 'nonprod.foobar.onglueops.rocks'}},
+            {'id': 'lb', 'operation': 'k3d-lb-nodes', 'input': {'captain_domain': 'nonprod.foobar.onglueops.rocks'}},
+            {'id': 'captain', 'operation': 'captain-manifests', 'depends_on': ['buckets'], 'input': {'captain_domain': 'nonprod.foobar.onglueops.rocks', 'tenant_github_organization_name': 'development-tenant-foobar', 'tenant_deployment_configurations_repository_name': 'deployment-configurations'}},
+        ],
+        description='Operations named after their endpoint, each carrying that endpoint\'s request body. Operations without a pending dependency run concurrently.'
+    )
+
+class BatchOperationResult(BaseModel):
+    operation: str = Field(..., example='storage-buckets')
+    status: Literal['succeeded', 'failed', 'skipped'] = Field(..., example='succeeded', description='skipped: a dependency did not succeed.')
+    result: Optional[str] = Field(default=None, description='What the endpoint would have returned.')
+    error: Optional[dict] = Field(default=None, example=None, description='status and detail of the failure.')
+    duration_seconds: Optional[float] = Field(default=None, example=3.2)
+
+class BatchResponse(BaseModel):
+    results: Dict[str, BatchOperationResult]
+
+TeardownStep = Literal['chisel', 'k3d-lb-nodes', 'storage-buckets', 'captain-domain-data']
+
+class TeardownRequest(BaseModel):
+    captain_domain: str = Field(..., example='nonprod.foobar.onglueops.rocks')
+    steps: List[TeardownStep] = Field(
+        default=['chisel', 'k3d-lb-nodes', 'storage-buckets', 'captain-domain-data'],
+        min_length=1,
+        description='What to tear down (default: everything): chisel nodes, k3d-lb nodes, the storage buckets, and the nuke-captain-domain-data workflow dispatch.'
+    )
+
+class TeardownStepResult(BaseModel):
+    status: Literal['succeeded', 'failed'] = Field(..., example='succeeded')
+    result: Optional[Any] = Field(default=None, description='What the step returned (e.g. the deleted bucket names or the dispatched workflow run).')
+    error: Optional[dict] = Field(default=None, example=None, description='status and detail of the failure.')
+    duration_seconds: Optional[float] = Field(default=None, example=12.4)
+
+class TeardownResponse(BaseModel):
+    captain_domain: str = Field(..., example='nonprod.foobar.onglueops.rocks')
+    succeeded: bool = Field(..., example=True)
+    steps: Dict[str, TeardownStepResult]
+
+class JobTimings(BaseModel):
+    queued_seconds: float = Field(..., example=0.0)
+    run_seconds: Optional[float] = Field(default=None, example=74.2)
+    phases: Dict[str, float] = Field(default_factory=dict, example={'iso_upload': 1.4, 'ip_discovery': 41.8})
+
+class JobStatusResponse(BaseModel):
+    id: str = Field(..., example='3f2b9c0e8d7a4e6f9a1b2c3d4e5f6a7b')
+    kind: str = Field(..., example='k3d-lb-nodes')
+    status: Literal['queued', 'running', 'succeeded', 'failed'] = Field(..., example='running')
+    phase: str = Field(..., example='ip_discovered', description='Latest phase reported by the job (queued/running/succeeded when it reports none).')
+    nodes: Dict[str, str] = Field(default_factory=dict, example={'nonprod.foobar.onglueops.rocks-exit1': 'started'}, description='Latest phase per node (per operation id for /v1/batch).')
+    submitted_at: float = Field(..., example=1767225600.0)
+    started_at: Optional[float] = Field(default=None, example=1767225600.1)
+    finished_at: Optional[float] = Field(default=None, example=None)
+    timings: JobTimings
+    result: Optional[Union[str, BatchResponse, TeardownResponse]] = Field(default=None, description='What the endpoint would have returned (e.g. the chisel manifest), once succeeded.')
+    error: Optional[dict] = Field(default=None, example=None, description='status and detail of the failure, once failed.')
+
 class GitHubWorkflowRunStatusRequest(BaseModel):
     run_url: str = Field(..., example='https://github.com/internal-GlueOps/gha-tools-api/actions/runs/12345678')
 
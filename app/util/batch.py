@@ -0,0 +1,108 @@
+"""
+Batch execution of tool operations.
+
+Runs a list of operations, each named after its endpoint and carrying that endpoint's request
+body, in one request. An operation starts as soon as every operation it depends_on has
+succeeded, so independent ones run concurrently; one whose dependency failed or was skipped is
+skipped. The response maps each operation id to its status and result (or error).
+
+Provisioning operations go through the same single-flight coalescing as their endpoints, and
+the blocking ones (chisel, storage buckets, AWS credentials) run in worker threads; chisel and
+storage buckets hold the same per-captain_domain lock as their endpoints while they do.
+"""
+
+import asyncio
+import time
+
+from fastapi import HTTPException
+from util import domain_locks, storage, aws_setup_test_account_credentials, hetzner, k3d_lb, opsgenie, incidentio, captain_manifests, kube_apiserver, kube_rbac, single_flight
+
+
+async def _render(render, request):
+    return render(request)
+
+
+# operation -> async callable(request) returning what the endpoint returns.
+_OPERATIONS = {
+    "storage-buckets": lambda r: single_flight.run(
+        "storage-buckets", r, None, lambda: domain_locks.run_in_thread("storage-buckets", r.captain_domain, storage.create_all_buckets, r.captain_domain)
+    ),
+    "k3d-lb-nodes": lambda r: single_flight.run("k3d-lb-nodes", r, None, lambda: k3d_lb.create_nodes(r)),
+    "chisel": lambda r: single_flight.run("chisel", r, None, lambda: domain_locks.run_in_thread("chisel", r.captain_domain, hetzner.create_instances, r)),
+    "setup-aws-account-credentials": lambda r: asyncio.to_thread(
+        aws_setup_test_account_credentials.create_admin_credentials_within_captain_account, r.aws_sub_account_name
+    ),
+    "opsgenie": lambda r: _render(opsgenie.create_opsgeniealerts_manifest, r),
+    "incidentio": lambda r: _render(incidentio.create_incidentioalerts_manifest, r),
+    "kube-apiserver": lambda r: _render(kube_apiserver.create_kube_apiserver_manifest, r),
+    "kube-rbac": lambda r: _render(kube_rbac.create_kube_rbac_manifest, r),
+    "captain-manifests": lambda r: _render(
+        lambda r: captain_manifests.generate_manifests(
+            r.captain_domain, r.tenant_github_organization_name, r.tenant_deployment_configurations_repository_name
+        ),
+        r,
+    ),
+}
+
+
+def validate(operations):
+    """422 on duplicate ids, unknown dependencies or a dependency cycle, before anything runs."""
+    ids = [op.id for op in operations]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicates:
+        raise HTTPException(status_code=422, detail=f"Duplicate operation id(s): {duplicates}")
+    for op in operations:
+        unknown = [d for d in op.depends_on if d not in ids]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Operation {op.id!r} depends on unknown id(s): {unknown}")
+
+    # Kahn's algorithm: whatever can't be ordered is on (or behind) a cycle.
+    pending = {op.id: set(op.depends_on) for op in operations}
+    while True:
+        ready = [i for i, deps in pending.items() if not deps]
+        if not ready:
+            break
+        for i in ready:
+            del pending[i]
+        for deps in pending.values():
+            deps.difference_update(ready)
+    if pending:
+        raise HTTPException(status_code=422, detail=f"Dependency cycle among operation(s): {sorted(pending)}")
+
+
+async def run(operations, emit=None) -> dict:
+    """Run operations (already checked by validate) in dependency order; returns {"results": {id: entry}}.
+
+    emit, if given, is called with {"node": id, "phase": status} as each operation starts and ends.
+    """
+    results = {op.id: {"operation": op.operation, "status": "skipped", "result": None, "error": None, "duration_seconds": None} for op in operations}
+    tasks = {}
+
+    async def execute(op):
+        if op.depends_on:
+            await asyncio.gather(*(tasks[d] for d in op.depends_on))
+            failed = [d for d in op.depends_on if results[d]["status"] != "succeeded"]
+            if failed:
+                results[op.id]["error"] = {"status": 424, "detail": f"Dependency {failed} did not succeed."}
+                if emit is not None:
+                    emit({"node": op.id, "phase": "skipped"})
+                return
+        entry = results[op.id]
+        if emit is not None:
+            emit({"node": op.id, "phase": "running"})
+        started = time.monotonic()
+        try:
+            entry["result"] = await _OPERATIONS[op.operation](op.input)
+            entry["status"] = "succeeded"
+        except HTTPException as e:
+            entry["status"], entry["error"] = "failed", {"status": e.status_code, "detail": e.detail}
+        except Exception as e:
+            entry["status"], entry["error"] = "failed", {"status": 500, "detail": str(e)}
+        entry["duration_seconds"] = round(time.monotonic() - started, 3)
+        if emit is not None:
+            emit({"node": op.id, "phase": entry["status"]})
+
+    for op in operations:
+        tasks[op.id] = asyncio.ensure_future(execute(op))
+    await asyncio.gather(*tasks.values())
+    return {"results": results}
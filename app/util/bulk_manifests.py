@@ -0,0 +1,63 @@
+"""
+Bulk manifest generation.
+
+Renders many per-tenant manifest requests (opsgenie, incidentio, kube-apiserver, kube-rbac,
+captain-manifests) in one pass and streams them back as a single multi-document YAML.
+"""
+
+import re
+from fastapi import HTTPException
+from util import opsgenie, incidentio, kube_apiserver, kube_rbac, captain_manifests
+
+# A line holding only the YAML document separator.
+_DOCUMENT_SEPARATOR_RE = re.compile(r'^---[ \t]*$', re.MULTILINE)
+
+# generator -> (parse, render). parse runs for every item before the first byte is streamed so
+# an invalid tenant still fails the whole request with a 422; render runs lazily while streaming.
+_GENERATORS = {
+    "opsgenie": (lambda r: r, opsgenie.create_opsgeniealerts_manifest),
+    "incidentio": (lambda r: r, incidentio.create_incidentioalerts_manifest),
+    "kube-apiserver": (kube_apiserver.parse_request, lambda parsed: kube_apiserver.render_manifest(*parsed)),
+    "kube-rbac": (kube_rbac.parse_request, lambda parsed: kube_rbac.render_manifest(*parsed)),
+    "captain-manifests": (
+        lambda r: (
+            r.captain_domain,
+            r.tenant_github_organization_name,
+            r.tenant_deployment_configurations_repository_name,
+        ),
+        lambda parsed: captain_manifests.generate_manifests(*parsed),
+    ),
+}
+
+
+def _split_documents(manifest: str):
+    for document in _DOCUMENT_SEPARATOR_RE.split(manifest):
+        document = document.strip()
+        if document:
+            yield document
+
+
+def stream_manifests(items):
+    """Validate every item, then return a generator that yields the combined YAML.
+
+    Documents shared across tenants (e.g. the kube-rbac ClusterRoles or the kube-apiserver
+    Namespace) are byte-identical, so each distinct document is emitted only once.
+    """
+    parsed = []
+    for index, item in enumerate(items):
+        parse, render = _GENERATORS[item.generator]
+        try:
+            parsed.append((render, parse(item.input)))
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"manifests[{index}] ({item.generator}): {e.detail}") from e
+
+    def render_all():
+        emitted = set()
+        for render, args in parsed:
+            for document in _split_documents(render(args)):
+                if document in emitted:
+                    continue
+                emitted.add(document)
+                yield f"---\n{document}\n"
+
+    return render_all()
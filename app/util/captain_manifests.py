@@ -5,32 +5,50 @@ This module generates YAML manifests for captain deployments using Jinja2 templa
 """
 
 import os
-from jinja2 import Environment, FileSystemLoader
+from functools import lru_cache
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
 
-def generate_manifests(captain_domain: str, tenant_github_organization_name: str, tenant_deployment_configurations_repository_name: str) -> dict:
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), '..', 'templates', 'captain_manifests')
+TEMPLATE_NAMES = ('namespace.yaml.j2', 'appproject.yaml.j2', 'appset.yaml.j2')
+
+# Optional on-disk bytecode cache so a fresh worker skips the Jinja compile step too.
+BYTECODE_CACHE_DIR = os.getenv("CAPTAIN_MANIFESTS_BYTECODE_CACHE_DIR")
+RENDER_CACHE_SIZE = int(os.getenv("CAPTAIN_MANIFESTS_RENDER_CACHE_SIZE", "256"))
+
+# One shared environment for the process. Custom delimiters avoid conflict with the Go
+# templates in appset.yaml.j2; auto_reload is off because the templates ship with the image.
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    variable_start_string='<%',
+    variable_end_string='%>',
+    auto_reload=False,
+    bytecode_cache=FileSystemBytecodeCache(BYTECODE_CACHE_DIR) if BYTECODE_CACHE_DIR else None,
+)
+
+# Parsed and compiled once at import (i.e. at startup), not per request.
+_templates = tuple(_env.get_template(name) for name in TEMPLATE_NAMES)
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def generate_manifests(captain_domain: str, tenant_github_organization_name: str, tenant_deployment_configurations_repository_name: str) -> str:
     """
     Generate captain manifests based on the provided configuration.
-    
+
+    Output is a pure function of the arguments, so it is memoized in an LRU keyed
+    by (captain_domain, org, repo); a repeat request is a dict lookup.
+
     Args:
         captain_domain: The captain domain (e.g., nonprod.antoniostaqueria.onglueops.com)
         tenant_github_organization_name: The tenant's GitHub organization name
         tenant_deployment_configurations_repository_name: The tenant's deployment configurations repository name
-    
+
     Returns:
-        dict: Status response with concatenated YAML manifests
+        str: Concatenated YAML manifests
     """
     # Extract environment name from captain_domain (first segment)
     environment_name = captain_domain.split('.')[0]
-    
-    # Set up Jinja2 environment with custom delimiters to avoid conflict with Go templates
-    templates_dir = os.path.join(os.path.dirname(__file__), '..', 'templates', 'captain_manifests')
-    env = Environment(
-        loader=FileSystemLoader(templates_dir),
-        variable_start_string='<%',
-        variable_end_string='%>'
-    )
-    
+
     # Template variables
     template_vars = {
         'environment_name': environment_name,
@@ -38,11 +56,6 @@ def generate_manifests(captain_domain: str, tenant_github_organization_name: str
         'tenant_github_organization_name': tenant_github_organization_name,
         'tenant_deployment_configurations_repository_name': tenant_deployment_configurations_repository_name
     }
-    
-    # Render all templates
-    namespace_yaml = env.get_template('namespace.yaml.j2').render(template_vars)
-    appproject_yaml = env.get_template('appproject.yaml.j2').render(template_vars)
-    appset_yaml = env.get_template('appset.yaml.j2').render(template_vars)
-    
-    # Concatenate all YAMLs with document separators
-    return f"{namespace_yaml}\n---\n{appproject_yaml}\n---\n{appset_yaml}"
+
+    # Render all templates and concatenate them with document separators
+    return "\n---\n".join(template.render(template_vars) for template in _templates)
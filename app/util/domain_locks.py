@@ -0,0 +1,175 @@
+"""
+Named async locks with pluggable backends, so POST/DELETE stay serialized per captain_domain
+when tools-api runs several workers or replicas.
+
+- memory: asyncio.Lock per name; only serializes within one process (the default).
+- file:   an flock()ed file per name in a directory; every process on the host, or on a shared
+          volume with POSIX lock support, sees the same locks.
+- sqlite: a lease row per name in a SQLite database on a shared volume. The holder renews its
+          lease while it holds the lock, so a crashed holder's lock expires after lease_seconds.
+
+Cross-process backends poll while the lock is held elsewhere and first take a per-process
+asyncio.Lock, so waiters in the same process queue without polling.
+
+shared_lock() is the one backend the endpoints use. These locks only serialize the requests
+themselves; see the README for the k3d-lb background work that is still per worker.
+"""
+
+import asyncio
+import fcntl
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+import glueops.setup_logging
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = glueops.setup_logging.configure(level=LOG_LEVEL)
+
+POLL_INTERVAL = 0.25
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+
+
+class MemoryLocks:
+    def __init__(self):
+        self._locks = {}
+
+    def lock(self, name: str):
+        return self._locks.setdefault(name, asyncio.Lock())
+
+
+class FileLocks:
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._local = MemoryLocks()
+
+    @asynccontextmanager
+    async def lock(self, name: str):
+        async with self._local.lock(name):
+            fd = os.open(os.path.join(self._directory, f"{_safe_name(name)}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        await asyncio.sleep(POLL_INTERVAL)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+
+class SqliteLocks:
+    """Database calls run in a worker thread with a short busy timeout, off the event loop."""
+
+    def __init__(self, path: str, lease_seconds: float = 600.0):
+        self._db = sqlite3.connect(path, isolation_level=None, timeout=1.0, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+        self._db_lock = threading.Lock()
+        self._lease = lease_seconds
+        self._local = MemoryLocks()
+
+    def _try_acquire(self, name: str, owner: str) -> bool:
+        now = time.time()
+        with self._db_lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                # Busy: another process is writing. Not acquired; the caller polls again.
+                return False
+            try:
+                self._db.execute("DELETE FROM locks WHERE name = ? AND expires < ?", (name, now))
+                inserted = self._db.execute(
+                    "INSERT OR IGNORE INTO locks (name, owner, expires) VALUES (?, ?, ?)", (name, owner, now + self._lease)
+                ).rowcount
+                self._db.execute("COMMIT")
+            except sqlite3.OperationalError:
+                self._db.execute("ROLLBACK")
+                return False
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return inserted == 1
+
+    def _execute(self, sql: str, params) -> int:
+        with self._db_lock:
+            return self._db.execute(sql, params).rowcount
+
+    async def _renew(self, name: str, owner: str):
+        while True:
+            await asyncio.sleep(self._lease / 3)
+            try:
+                renewed = await asyncio.to_thread(
+                    self._execute, "UPDATE locks SET expires = ? WHERE name = ? AND owner = ?", (time.time() + self._lease, name, owner)
+                )
+            except sqlite3.OperationalError as e:
+                # The lease still has two thirds left; try again at the next renewal.
+                logger.warning(f"Could not renew the lease on lock {name!r}: {e}")
+                continue
+            if renewed != 1:
+                logger.error(
+                    f"Lost the lease on lock {name!r} while holding it (it expired and was taken over); "
+                    f"another worker may now run concurrently. Raise the lock lease if this repeats."
+                )
+                return
+
+    @asynccontextmanager
+    async def lock(self, name: str):
+        async with self._local.lock(name):
+            owner = uuid.uuid4().hex
+            while not await asyncio.to_thread(self._try_acquire, name, owner):
+                await asyncio.sleep(POLL_INTERVAL)
+            renew = asyncio.create_task(self._renew(name, owner))
+            try:
+                yield
+            finally:
+                renew.cancel()
+                try:
+                    await asyncio.to_thread(self._execute, "DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+                except sqlite3.OperationalError as e:
+                    logger.warning(f"Could not release lock {name!r} ({e}); it frees up when its lease expires")
+
+
+def from_env(prefix: str):
+    """Backend selected by <prefix>LOCK_BACKEND (memory | file | sqlite) and <prefix>LOCK_PATH."""
+    backend = os.getenv(f"{prefix}LOCK_BACKEND", "memory").lower()
+    if backend == "memory":
+        return MemoryLocks()
+    path = os.environ[f"{prefix}LOCK_PATH"]
+    if backend == "file":
+        return FileLocks(path)
+    if backend == "sqlite":
+        return SqliteLocks(path, float(os.getenv(f"{prefix}LOCK_LEASE", "600")))
+    raise ValueError(f"Unknown {prefix}LOCK_BACKEND: {backend!r} (expected memory, file or sqlite)")
+
+
+_shared = None
+
+
+def shared_lock(name: str):
+    """name's lock from the process-wide backend (K3D_LB_LOCK_BACKEND/K3D_LB_LOCK_PATH).
+
+    One backend serializes every endpoint that works per captain_domain: k3d-lb, and the
+    chisel and storage-bucket create/delete that run in worker threads.
+    """
+    global _shared
+    if _shared is None:
+        _shared = from_env("K3D_LB_")
+    return _shared.lock(name)
+
+
+async def run_in_thread(kind: str, captain_domain: str, func, *args):
+    """func(*args) in a worker thread, serialized with every other kind call for captain_domain."""
+    async with shared_lock(f"{kind}-{captain_domain.strip().lower()}"):
+        return await asyncio.to_thread(func, *args)
@@ -0,0 +1,41 @@
+"""
+ETag helpers for the deterministic manifest endpoints.
+
+Those endpoints are pure functions of their request body (and of the app version, since a
+release can change the templates), so a hash over both identifies the rendered manifest
+without rendering it.
+"""
+
+import hashlib
+import json
+
+
+def compute_etag(request, version: str, parsed=None) -> str:
+    """Strong ETag over the request model's type, its canonical JSON form, and the app version.
+
+    model_dump fills in defaults and sort_keys fixes field order, so equivalent bodies hash
+    the same regardless of how the client serialized them. parsed, if given, is the endpoint's
+    normalized input (JSON-serializable) and is hashed instead of the body, so bodies that
+    render the same manifest share a tag.
+    """
+    payload = json.dumps(
+        [type(request).__name__, version, request.model_dump(mode="json") if parsed is None else parsed],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return f'"{hashlib.sha256(payload.encode()).hexdigest()[:32]}"'
+
+
+def if_none_match_matches(if_none_match, etag: str) -> bool:
+    """RFC 9110 If-None-Match: weak comparison against '*' or a comma-separated list of tags."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -2,6 +2,7 @@ import os
 from fastapi import FastAPI, Security, HTTPException, Depends, status, requests, Request
 import time
 import util.chisel
+from util import result_store
 from hcloud import Client
 from hcloud.images import Image
 from hcloud.server_types import ServerType
@@ -28,7 +29,12 @@ def multiline_to_singleline(input_text: str) -> str:
     return input_text.replace("\n", "\n")
 
 
-def create_instances(request):
+def create_instances(request, progress=None):
+    """Replace the chisel nodes for request.captain_domain and return the chisel manifest.
+
+    progress, if given, is called with a dict per node phase (created, ip_discovered); it
+    must be safe to call from a worker thread.
+    """
     captain_domain = request.captain_domain.strip()
     logger.info(f"Starting chisel node creation for captain_domain: {captain_domain}")
     
@@ -69,6 +75,10 @@ runcmd:
         for instance_name in instance_names:
             logger.info(f"Creating chisel node: {instance_name}")
             ip_addresses[instance_name] = create_server(instance_name, captain_domain, user_data)
+            if progress is not None:
+                # Hetzner assigns the public IPv4 in the create response.
+                progress({"node": instance_name, "phase": "created"})
+                progress({"node": instance_name, "phase": "ip_discovered", "ip": ip_addresses[instance_name]})
         
         logger.info(f"All chisel nodes created successfully. IP addresses: {ip_addresses}")
     except Exception as e:
@@ -79,6 +89,7 @@ runcmd:
         logger.info(f"Generating chisel YAML manifest...")
         yaml_manifest = util.chisel.create_chisel_yaml(captain_domain, credentials_for_chisel, ip_addresses, suffixes)
         logger.info(f"Successfully generated chisel YAML manifest for {captain_domain}")
+        result_store.save("chisel", captain_domain, yaml_manifest, [{"name": name} for name in instance_names])
         return yaml_manifest
     except Exception as e:
         logger.error(f"Failed to generate chisel YAML manifest: {str(e)}")
@@ -125,9 +136,26 @@ def create_server(server_name, captain_domain, user_data_one_line_format):
     return ipv4_address
 
 
+def last_manifest(captain_domain):
+    """The last chisel manifest generated for captain_domain, if all of its servers still exist."""
+    captain_domain = captain_domain.strip()
+    stored = result_store.load("chisel", captain_domain)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No stored chisel manifest for {captain_domain}; POST /v1/chisel to create nodes.")
+    manifest, nodes = stored
+    # One list call filtered by label, rather than a lookup per server.
+    existing = {server.name for server in client.servers.get_all(label_selector=f"captain_domain={captain_domain}")}
+    missing = sorted(node["name"] for node in nodes if node["name"] not in existing)
+    if missing:
+        result_store.forget("chisel", captain_domain)
+        raise HTTPException(status_code=404, detail=f"Chisel node(s) {missing} of the stored manifest no longer exist; POST /v1/chisel to recreate them.")
+    return manifest
+
+
 def delete_existing_servers(request):
     captain_domain = request.captain_domain.strip()
     logger.info(f"Starting deletion of existing chisel nodes for captain_domain: {captain_domain}")
+    result_store.forget("chisel", captain_domain)
     
     try:
         logger.info(f"Fetching all servers with captain_domain label...")
@@ -0,0 +1,212 @@
+"""
+Asynchronous jobs for the long-running provisioning endpoints.
+
+A request sent with `Prefer: respond-async` is accepted as a job instead of holding the
+connection open: the endpoint answers 202 with the job id at once, the work runs in the
+background, and GET /v1/jobs/{id} reports its status (queued, running, succeeded, failed), its
+latest phase per node, its timings and finally its result or error.
+
+Jobs of one kind (endpoint) run at most JOB_CONCURRENCY at a time, or
+JOB_CONCURRENCY_<KIND> (e.g. JOB_CONCURRENCY_K3D_LB_NODES) for that kind; the rest wait queued.
+Finished jobs are kept for JOB_RETENTION seconds. Jobs live in this process's memory, so a
+restart loses them, unless JOB_STORE_PATH names a SQLite file: each job's status is then also
+saved there (encrypted with the Fernet key JOB_STORE_KEY, as results may carry credentials)
+when it starts, about every JOB_STORE_FLUSH_INTERVAL seconds while it runs, and when it
+finishes, so every worker or replica sharing the file can answer GET /v1/jobs/{id}. The work
+itself still runs in the worker that accepted it, as do the concurrency limits; a job whose
+worker stops keeps its last saved status.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import glueops.setup_logging
+from cryptography.fernet import Fernet, InvalidToken
+from fastapi import HTTPException
+
+from util import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = glueops.setup_logging.configure(level=LOG_LEVEL)
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "3600"))
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "")
+JOB_STORE_FLUSH_INTERVAL = float(os.getenv("JOB_STORE_FLUSH_INTERVAL", "1"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    snapshot BLOB NOT NULL,
+    finished_at REAL
+)
+"""
+
+# job id -> job dict (see submit); the "task" entry also keeps the task referenced.
+_jobs = {}
+_limits = {}
+_db = None
+_fernet = None
+# Saves and loads run in worker threads, so the shared connection is guarded.
+_db_lock = threading.Lock()
+
+
+def _connection() -> sqlite3.Connection:
+    global _db, _fernet
+    if _db is None:
+        key = os.getenv("JOB_STORE_KEY")
+        if not key:
+            raise RuntimeError("JOB_STORE_PATH is set but JOB_STORE_KEY is not")
+        _fernet = Fernet(key)
+        _db = sqlite3.connect(JOB_STORE_PATH, isolation_level=None, check_same_thread=False, timeout=5.0)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute(_SCHEMA)
+    return _db
+
+
+def _snapshot(job: dict) -> str:
+    return json.dumps(
+        {**{k: v for k, v in job.items() if k != "task"}, "nodes": dict(job["nodes"]), "phase_timings": dict(job["phase_timings"])},
+        default=str,
+    )
+
+
+def _save(job_id: str, snapshot: str, finished_at):
+    try:
+        with _db_lock:
+            db = _connection()
+            db.execute("DELETE FROM jobs WHERE finished_at <= ?", (time.time() - JOB_RETENTION,))
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (id, snapshot, finished_at) VALUES (?, ?, ?)",
+                (job_id, _fernet.encrypt(snapshot.encode()), finished_at),
+            )
+    except Exception as e:
+        logger.error(f"Could not save the status of job {job_id}: {e}")
+
+
+def _load(job_id: str):
+    with _db_lock:
+        row = _connection().execute(
+            "SELECT snapshot FROM jobs WHERE id = ? AND (finished_at IS NULL OR finished_at > ?)",
+            (job_id, time.time() - JOB_RETENTION),
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(_fernet.decrypt(row[0]))
+        except InvalidToken:
+            logger.warning(f"Stored status of job {job_id} can't be decrypted with JOB_STORE_KEY")
+            return None
+
+
+def _limit(kind: str) -> asyncio.Semaphore:
+    if kind not in _limits:
+        env = f"JOB_CONCURRENCY_{kind.upper().replace('-', '_')}"
+        _limits[kind] = asyncio.Semaphore(int(os.getenv(env, str(JOB_CONCURRENCY))))
+    return _limits[kind]
+
+
+def _purge_finished():
+    now = time.time()
+    for job_id in [i for i, job in _jobs.items() if job["finished_at"] and job["finished_at"] + JOB_RETENTION <= now]:
+        del _jobs[job_id]
+
+
+def requested(prefer) -> bool:
+    """True when the Prefer header asks for an asynchronous response (RFC 7240 respond-async)."""
+    return bool(prefer) and "respond-async" in [p.strip().split(";")[0].lower() for p in prefer.split(",")]
+
+
+async def submit(kind: str, run) -> dict:
+    """Start run(emit) as a background job of kind; returns the new job's status."""
+    _purge_finished()
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "queued",
+        "phase": "queued",
+        "nodes": {},
+        "submitted_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "phase_timings": {},
+        "result": None,
+        "error": None,
+    }
+
+    def emit(event: dict):
+        # Called from the event loop or a worker thread; plain dict updates are safe either way.
+        job["phase"] = event.get("phase", job["phase"])
+        if "node" in event:
+            job["nodes"][event["node"]] = event.get("phase")
+
+    saved = None
+
+    async def persist():
+        # Only when something changed since the last save.
+        nonlocal saved
+        snapshot = _snapshot(job)
+        if JOB_STORE_PATH and snapshot != saved:
+            saved = snapshot
+            await asyncio.to_thread(_save, job["id"], snapshot, job["finished_at"])
+
+    async def flush():
+        while True:
+            await asyncio.sleep(JOB_STORE_FLUSH_INTERVAL)
+            await persist()
+
+    async def execute():
+        async with _limit(kind):
+            job["status"] = job["phase"] = "running"
+            job["started_at"] = time.time()
+            # The job's own phase timings, like a request's Server-Timing.
+            job["phase_timings"] = metrics.start_request()
+            flusher = asyncio.create_task(flush()) if JOB_STORE_PATH else None
+            try:
+                job["result"] = await run(emit)
+                job["status"] = job["phase"] = "succeeded"
+            except HTTPException as e:
+                job["status"], job["error"] = "failed", {"status": e.status_code, "detail": e.detail}
+            except Exception as e:
+                logger.error(f"Job {job['id']} ({kind}) failed: {e}")
+                job["status"], job["error"] = "failed", {"status": 500, "detail": str(e)}
+            finally:
+                job["finished_at"] = time.time()
+                if flusher is not None:
+                    flusher.cancel()
+                await persist()
+
+    _jobs[job["id"]] = job
+    await persist()
+    job["task"] = asyncio.create_task(execute())
+    logger.info(f"Accepted {kind} job {job['id']}")
+    return _status(job)
+
+
+async def status(job_id: str) -> dict:
+    """The job's status, from this worker's memory or, for another worker's job, the job store."""
+    job = _jobs.get(job_id)
+    if job is None and JOB_STORE_PATH:
+        job = await asyncio.to_thread(_load, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id} (unknown, or finished more than {JOB_RETENTION:.0f}s ago).")
+    return _status(job)
+
+
+def _status(job: dict) -> dict:
+    now = time.time()
+    started, finished = job["started_at"], job["finished_at"]
+    return {
+        **{k: v for k, v in job.items() if k not in ("task", "phase_timings")},
+        "nodes": dict(job["nodes"]),
+        "timings": {
+            "queued_seconds": round((started or now) - job["submitted_at"], 3),
+            "run_seconds": round((finished or now) - started, 3) if started else None,
+            "phases": {phase: round(seconds, 3) for phase, seconds in job["phase_timings"].items()},
+        },
+    }
@@ -1,12 +1,24 @@
 import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import hashlib
+import ipaddress
 import os
 import re
+import secrets
+import statistics
+import time
 
 import httpx
 from fastapi import HTTPException
 from glueops.proxmox import ProxmoxClient, build_cloudinit_iso
 from glueops.waggle import WaggleClient
 import util.chisel
+from util.proxmox_api import ProxmoxApi
+from util.proxmox_scheduler import ProxmoxScheduler
+from util import domain_locks, metrics, result_store
+from util.task_queue import TaskQueue
 import glueops.setup_logging
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -23,11 +35,89 @@ CREATOR_TAG = "tools-api"
 # so stale ones are pruned by this prefix after a successful create.
 IMAGE_PREFIX = "tools-api-k3d-lb-"
 
-# Serializes create/delete per captain_domain so a concurrent POST/DELETE for the
-# same domain can't interleave (single-worker FastAPI, so an asyncio.Lock suffices).
-_domain_locks = {}
+# Optional warm pool of pre-booted VMs (K3D_LB_WARM_POOL_SIZE > 0). Each warm VM is
+# named WARM_POOL_PREFIX<id>, has a one-placement Waggle pool of the same name, and
+# keeps that name as a tag after it is claimed so the pool can be released on delete.
+# WARM_TAG marks an unclaimed VM; WARM_READY_TAG is added once cloud-init finished
+# and its ISO is gone, i.e. once it can be handed out.
+WARM_TAG = "k3d-lb-warm"
+WARM_READY_TAG = "k3d-lb-ready"
+WARM_POOL_PREFIX = "k3d-lb-warm-"
+WARM_POOL_SIZE = int(os.getenv("K3D_LB_WARM_POOL_SIZE", "0"))
+WARM_POOL_INTERVAL = float(os.getenv("K3D_LB_WARM_POOL_INTERVAL", "60"))
+
+# Optional linked-clone provisioning (K3D_LB_LINKED_CLONES=true): each node keeps
+# a template VM per (cached image, slot), tagged TEMPLATE_TAG + cache_name + slot
+# tag, and VMs are linked clones of it instead of full imports. Nodes whose
+# storage can't do linked clones fall back to the full-import path.
+TEMPLATE_TAG = "k3d-lb-template"
+LINKED_CLONES = os.getenv("K3D_LB_LINKED_CLONES", "false").lower() in ("true", "1", "yes")
+
+# Optional local vmid allocation (K3D_LB_VMID_RANGE="start-end"): vmids are
+# reserved in-process from this range instead of taken from the non-reserving
+# /cluster/nextid, so our own parallel builds never collide. The set of ids in use
+# is re-read from the cluster every K3D_LB_VMID_RESYNC_INTERVAL seconds, and an id
+# found taken by an external creator is marked used and skipped. Each process
+# starts its scan at a random offset into the range, so several workers sharing
+# it rarely race for the same id.
+VMID_RANGE = os.getenv("K3D_LB_VMID_RANGE", "")
+VMID_RESYNC_INTERVAL = float(os.getenv("K3D_LB_VMID_RESYNC_INTERVAL", "30"))
+
+# Per-hypervisor / per-storage concurrency limits for create, clone, resize,
+# start and delete (0 = unlimited). Adaptive limits halve on a pmxcfs/flock lock
+# timeout (each costs ~10s inside PVE) and creep back up on clean operations.
+# The storage limit is keyed by PROXMOX_STORAGE cluster-wide, for shared storage.
+MAX_OPS_PER_NODE = int(os.getenv("K3D_LB_MAX_OPS_PER_NODE", "4"))
+MAX_OPS_PER_STORAGE = int(os.getenv("K3D_LB_MAX_OPS_PER_STORAGE", "0"))
+ADAPTIVE_CONCURRENCY = os.getenv("K3D_LB_ADAPTIVE_CONCURRENCY", "true").lower() in ("true", "1", "yes")
+
+# Datacenter/slot lookups and SHA256SUMS are cached this many seconds (0 = off);
+# concurrent misses share a single fetch. A release published within the TTL is
+# picked up once the cached SHA256SUMS entry expires.
+METADATA_CACHE_TTL = float(os.getenv("K3D_LB_METADATA_CACHE_TTL", "300"))
+
+# Optional hedged builds (K3D_LB_HEDGE_PERCENTILE > 0): a build still running
+# past that percentile of recent build times (K3D_LB_HEDGE_DELAY seconds until
+# enough builds were seen), or one that failed, gets a second build on an
+# alternate Waggle placement; the first to finish wins and the other is torn
+# down. The alternate placement is a one-placement pool under the domain's pool
+# name, so the normal delete/reconcile paths release it.
+HEDGE_PERCENTILE = float(os.getenv("K3D_LB_HEDGE_PERCENTILE", "0"))
+HEDGE_DELAY = float(os.getenv("K3D_LB_HEDGE_DELAY", "180"))
+
+# IP discovery gives up on a VM after this many seconds; a VM that stops or
+# errors fails at once instead.
+IP_DISCOVERY_TIMEOUT = float(os.getenv("K3D_LB_IP_DISCOVERY_TIMEOUT", "300"))
+
+# Optional durable cleanup queue (K3D_LB_TASK_QUEUE_PATH, a SQLite file on a
+# persistent volume): post-create cleanup (cloud-init wait, ISO eject/delete,
+# stale image prune) is recorded there and resumed after a restart, or by
+# another worker sharing the file, instead of waiting for the next POST/DELETE
+# sweep. A create/delete supersedes the domain's queued cleanup in any worker.
+TASK_QUEUE_PATH = os.getenv("K3D_LB_TASK_QUEUE_PATH", "")
+TASK_QUEUE_CONCURRENCY = int(os.getenv("K3D_LB_TASK_QUEUE_CONCURRENCY", "4"))
+
+# Optional background image manager (K3D_LB_IMAGE_REFRESH_INTERVAL > 0): polls
+# SHA256SUMS for a new release, pre-caches it on every online node, and prunes
+# stale IMAGE_PREFIX volumes (and templates), so creates don't wait on a cold
+# download. When on, create cleanups leave pruning to it.
+IMAGE_REFRESH_INTERVAL = float(os.getenv("K3D_LB_IMAGE_REFRESH_INTERVAL", "0"))
+
+# Cloud-init ISOs are built in this many worker threads rather than on the
+# event loop, where building one stalls every other build and request.
+ISO_BUILD_WORKERS = int(os.getenv("K3D_LB_ISO_BUILD_WORKERS", "2"))
+
+# Progress sink of the current create_nodes call (see util.progress); build
+# steps report through _report, which is a no-op when nobody is listening
+# (plain requests, background warm-pool builds).
+_progress = contextvars.ContextVar("k3d_lb_progress", default=None)
 
 _proxmox_client = None
+_proxmox_api_client = None
+_scheduler = None
+_http_client = None
+_iso_executor = None
+_metadata_cache = {}
 _waggle_client = None
 
 
@@ -54,6 +144,29 @@ def _proxmox() -> ProxmoxClient:
     return _proxmox_client
 
 
+def _proxmox_api() -> ProxmoxApi:
+    global _proxmox_api_client
+    if _proxmox_api_client is None:
+        _proxmox_api_client = ProxmoxApi.from_env()
+    return _proxmox_api_client
+
+
+def _scheduled(node: str, phase: str, operation):
+    """Run operation() under the node's (and storage's) Proxmox concurrency limit.
+
+    Its duration is recorded as phase on node, excluding the time spent queued.
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ProxmoxScheduler(MAX_OPS_PER_NODE, MAX_OPS_PER_STORAGE, ADAPTIVE_CONCURRENCY, _is_transient_lock_timeout)
+
+    async def timed_operation():
+        with metrics.timed(phase, node):
+            return await operation()
+
+    return _scheduler.run(node, os.getenv("PROXMOX_STORAGE"), timed_operation)
+
+
 def _waggle() -> WaggleClient:
     global _waggle_client
     if _waggle_client is None:
@@ -61,8 +174,71 @@ def _waggle() -> WaggleClient:
     return _waggle_client
 
 
-def _domain_lock(captain_domain: str) -> asyncio.Lock:
-    return _domain_locks.setdefault(captain_domain, asyncio.Lock())
+def _http() -> httpx.AsyncClient:
+    """Shared pooled client for plain HTTP fetches (SHA256SUMS)."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=30.0, follow_redirects=True)
+    return _http_client
+
+
+def _cached(key, fetch, refresh: bool = False) -> asyncio.Future:
+    """TTL-cached fetch() keyed by key; concurrent misses share one in-flight fetch.
+
+    Failures and None results are not cached, so a transient error or a missing
+    SHA256SUMS is retried on the next call. refresh skips a cached result and
+    replaces it with a fresh fetch.
+    """
+    entry = _metadata_cache.get(key)
+    if entry and (entry[0] is None or (entry[0] > time.monotonic() and not refresh)):
+        return asyncio.shield(entry[1])
+    task = asyncio.create_task(fetch(), context=metrics.detached_context())
+    _metadata_cache[key] = (None, task)
+
+    def _done(t):
+        if _metadata_cache.get(key, (None, None))[1] is not t:
+            return
+        if t.cancelled() or t.exception() is not None or t.result() is None or METADATA_CACHE_TTL <= 0:
+            del _metadata_cache[key]
+        else:
+            _metadata_cache[key] = (time.monotonic() + METADATA_CACHE_TTL, t)
+
+    task.add_done_callback(_done)
+    return asyncio.shield(task)
+
+
+def _waggle_datacenter() -> asyncio.Future:
+    name = os.environ["WAGGLE_DATACENTER_NAME"]
+    return _cached(("datacenter", name), lambda: _waggle().get_datacenter_by_name(name))
+
+
+def _waggle_slot() -> asyncio.Future:
+    name = os.environ["WAGGLE_SLOT_NAME"]
+    return _cached(("slot", name), lambda: _waggle().get_slot_by_name(name))
+
+
+def _report(vm_name: str, phase: str, **detail):
+    emit = _progress.get()
+    if emit is not None:
+        emit({"node": vm_name, "phase": phase, **detail})
+
+
+# Serializes create/delete per captain_domain so a concurrent POST/DELETE for the
+# same domain can't interleave. K3D_LB_LOCK_BACKEND picks how (see
+# util.domain_locks): the in-process default only covers a single worker; file or
+# sqlite (K3D_LB_LOCK_PATH on a shared volume) cover several workers/replicas.
+# The same backend serializes warm-pool claims and replenish passes.
+# Not everything is covered yet: background ISO cleanup is only cancelled across
+# workers when it runs through the task queue (K3D_LB_TASK_QUEUE_PATH), and a
+# losing hedged build is torn down by the worker that started it, so with more
+# than one worker the queue is required and hedging must stay off (see
+# start_background_tasks). Chisel and storage-bucket requests share the backend.
+def _named_lock(name: str):
+    return domain_locks.shared_lock(name)
+
+
+def _domain_lock(captain_domain: str):
+    return _named_lock(f"domain-{captain_domain}")
 
 
 def _pool_name(captain_domain: str) -> str:
@@ -75,7 +251,27 @@ def _iso_filename(vm_name: str) -> str:
     return f"{CREATOR_TAG}-{vm_name}-cloudinit.iso"
 
 
-def _user_data(credentials_for_chisel: str) -> str:
+def _chisel_run_command(credentials_for_chisel: str) -> str:
+    # Named so it can be replaced in place when credentials are pushed later
+    # (warm-pool claims); see _chisel_start_script.
+    return (
+        "docker run -d --name chisel --restart always -p 9090:9090 -p 443:443 -p 80:80 "
+        f"docker.io/jpillora/chisel:1 server --reverse --port=9090 --auth='{credentials_for_chisel}'"
+    )
+
+
+def _chisel_start_script(credentials_for_chisel: str) -> str:
+    # Fed to `sh -s` over the guest agent's stdin so the credentials never show
+    # up in a Proxmox task log. Also removes unnamed chisel containers started by
+    # older user-data.
+    return (
+        "docker rm -f chisel >/dev/null 2>&1 || true\n"
+        "docker ps -aq --filter ancestor=docker.io/jpillora/chisel:1 | xargs -r docker rm -f >/dev/null\n"
+        f"{_chisel_run_command(credentials_for_chisel)}\n"
+    )
+
+
+def _user_data(credentials_for_chisel=None) -> str:
     # K3D_LB_VM_IMAGE (GlueOps/proxmox-images-chisel) bakes in qemu-guest-agent,
     # docker, and the chisel image, so the fast path here is just `docker run`:
     # no package_update/packages stage, which would otherwise cost an apt-get
@@ -86,19 +282,41 @@ def _user_data(credentials_for_chisel: str) -> str:
     # an image that already has docker.io breaks the boot: get.docker.com pulls
     # docker-ce over it, dpkg fails on the conflict, and cloud-init abandons the
     # rest of runcmd before chisel ever starts.
-    return f"""#cloud-config
+    #
+    # Warm-pool VMs boot without credentials; chisel is started when claimed.
+    user_data = """#cloud-config
 runcmd:
   - command -v qemu-ga >/dev/null || (apt-get update && apt-get install -y qemu-guest-agent)
   - systemctl enable --now qemu-guest-agent
   - command -v docker >/dev/null || (curl -fsSL https://get.docker.com -o get-docker.sh && sh get-docker.sh)
-  - docker run -d --restart always -p 9090:9090 -p 443:443 -p 80:80 docker.io/jpillora/chisel:1 server --reverse --port=9090 --auth='{credentials_for_chisel}'
 """
+    if credentials_for_chisel is not None:
+        user_data += f"  - {_chisel_run_command(credentials_for_chisel)}\n"
+    return user_data
 
 
 def _meta_data(vm_name: str) -> str:
     return f"instance-id: {vm_name}\nlocal-hostname: {vm_name}\n"
 
 
+async def _upload_cloudinit_iso(px: ProxmoxClient, node: str, vm_name: str, user_data: bytes, hostname: str = None) -> str:
+    """Build vm_name's cloud-init ISO in the ISO worker pool and upload it; returns its filename.
+
+    user_data is rendered and encoded once per request by the caller; only the
+    meta-data (hostname, default vm_name) differs per VM. The ISO bytes are
+    dropped as soon as the upload returns rather than held for the rest of the build.
+    """
+    global _iso_executor
+    if _iso_executor is None:
+        _iso_executor = concurrent.futures.ThreadPoolExecutor(max_workers=ISO_BUILD_WORKERS, thread_name_prefix="k3d-lb-iso")
+    with metrics.timed("iso_build", node):
+        iso_bytes = await asyncio.get_running_loop().run_in_executor(
+            _iso_executor, build_cloudinit_iso, user_data, _meta_data(hostname or vm_name).encode()
+        )
+    with metrics.timed("iso_upload", node):
+        return await px.upload_iso(node, _iso_filename(vm_name), iso_bytes)
+
+
 async def _fetch_expected_sha256(download_server_url: str, filename: str):
     """Look up filename's digest in the download server's SHA256SUMS manifest.
 
@@ -108,16 +326,15 @@ async def _fetch_expected_sha256(download_server_url: str, filename: str):
     """
     url = f"{download_server_url.rstrip('/')}/SHA256SUMS"
     try:
-        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as c:
-            r = await c.get(url)
-            if r.status_code >= 400:
-                logger.info(f"No SHA256SUMS at {url} ({r.status_code}); skipping image checksum verification")
-                return None
-            for line in r.text.splitlines():
-                parts = line.split()
-                if len(parts) == 2 and parts[1].lstrip("*") == filename:
-                    logger.info(f"Expected {filename} sha256: {parts[0]}")
-                    return parts[0]
+        r = await _http().get(url)
+        if r.status_code >= 400:
+            logger.info(f"No SHA256SUMS at {url} ({r.status_code}); skipping image checksum verification")
+            return None
+        for line in r.text.splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[1].lstrip("*") == filename:
+                logger.info(f"Expected {filename} sha256: {parts[0]}")
+                return parts[0]
     except httpx.HTTPError as e:
         logger.warning(f"Could not fetch {url}: {e}; skipping image checksum verification")
         return None
@@ -132,8 +349,8 @@ async def _fetch_expected_sha256(download_server_url: str, filename: str):
 _cleanup_tasks = {}
 
 
-def _spawn_cleanup(captain_domain: str, coro):
-    task = asyncio.create_task(coro)
+def _spawn_cleanup(captain_domain: str, coro) -> asyncio.Task:
+    task = asyncio.create_task(coro, context=metrics.detached_context())
     _cleanup_tasks[captain_domain] = task
 
     def _done(t):
@@ -143,13 +360,51 @@ def _spawn_cleanup(captain_domain: str, coro):
             logger.error(f"Background cleanup for {captain_domain!r} failed: {t.exception()!r}")
 
     task.add_done_callback(_done)
+    return task
+
+
+_task_queue = None
+
+
+async def _schedule_cleanup(captain_domain: str, vms: list, cache_name):
+    """Run _finalize_cleanup in the background, through the durable queue when configured.
+
+    Called once the VMs are up: a queue that can't take the task (e.g. a locked shared
+    file) must not fail the create, so the cleanup then runs in memory instead.
+    """
+    if _task_queue is not None:
+        try:
+            await _task_queue.enqueue("finalize_cleanup", captain_domain, {"captain_domain": captain_domain, "vms": vms, "cache_name": cache_name})
+            return
+        except Exception as e:
+            logger.error(f"Could not queue the background cleanup for {captain_domain} ({e}); running it in this worker instead")
+    _spawn_cleanup(captain_domain, _finalize_cleanup(captain_domain, vms, cache_name))
 
 
-async def _cancel_stale_cleanup(captain_domain: str):
-    """Called under the domain lock before any create/delete touches VMs/ISOs."""
+async def _run_queued_cleanup(payload: dict):
+    captain_domain = payload["captain_domain"]
+    # Registered like an in-memory cleanup, so a newer create/delete for the
+    # domain cancels it the same way (_cancel_stale_cleanup).
+    task = _spawn_cleanup(captain_domain, _finalize_cleanup(captain_domain, payload["vms"], payload["cache_name"]))
+    try:
+        await asyncio.wait({task})
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if not task.cancelled():
+        task.result()
+
+
+async def _cancel_stale_cleanup(captain_domain: str) -> bool:
+    """Called under the domain lock before any create/delete touches VMs/ISOs.
+
+    Returns True if a still-running cleanup was cancelled (its ISOs may still be attached).
+    """
+    # Queued cleanup is dropped outright (a running one is cancelled, below).
+    superseded = _task_queue is not None and await _task_queue.supersede(captain_domain)
     task = _cleanup_tasks.get(captain_domain)
     if task is None or task.done():
-        return
+        return superseded
     logger.info(f"Cancelling superseded background cleanup for {captain_domain}")
     task.cancel()
     try:
@@ -158,6 +413,7 @@ async def _cancel_stale_cleanup(captain_domain: str):
         pass
     except Exception as e:
         logger.warning(f"Superseded cleanup for {captain_domain} raised during cancel: {e}")
+    return True
 
 
 async def _finalize_cleanup(captain_domain: str, vms: list, cached_image=None):
@@ -170,24 +426,30 @@ async def _finalize_cleanup(captain_domain: str, vms: list, cached_image=None):
 
     async def one(vm):
         try:
-            await px.wait_for_cloud_init(vm["node"], vm["vmid"])
+            with metrics.timed("cloud_init_wait", vm["node"]):
+                await px.wait_for_cloud_init(vm["node"], vm["vmid"])
         except Exception as e:
             logger.warning(f"Cloud-init wait failed for {vm['vm_name']} (vmid {vm['vmid']}): {e}; ejecting ISO anyway")
-        await px.eject_and_delete_iso(vm["node"], vm["vmid"], vm["iso_filename"])
+        with metrics.timed("iso_eject", vm["node"]):
+            await px.eject_and_delete_iso(vm["node"], vm["vmid"], vm["iso_filename"])
 
     await asyncio.gather(*(one(vm) for vm in vms))
 
     # Every image release leaves the previous checksum-keyed volume cached on
     # each node (~700MB). Prune here rather than in the create path: by now our
     # own imports are done, and a concurrent create for another captain_domain
-    # would be importing the current image, which is the one we keep.
-    if cached_image:
+    # would be importing the current image, which is the one we keep. With the
+    # image manager on it is the only pruner: cached_image was resolved when
+    # this create started and may already be older than the release it cached.
+    if cached_image and IMAGE_REFRESH_INTERVAL <= 0:
         try:
             pruned = await px.prune_import_images(rf"{re.escape(IMAGE_PREFIX)}.*\.qcow2", keep=cached_image)
             if pruned:
                 logger.info(f"Pruned {pruned} stale k3d-lb image(s) from the import cache")
         except Exception as e:
             logger.warning(f"Stale image prune failed: {e}")
+        if LINKED_CLONES:
+            await _prune_templates(cached_image)
 
     logger.info(f"Background cloud-init/ISO cleanup complete for captain_domain: {captain_domain}")
 
@@ -217,39 +479,590 @@ def _is_transient_lock_timeout(e: Exception) -> bool:
     return "got lock request timeout" in text or "- got timeout" in text
 
 
-async def _create_vm_with_vmid_retry(px: ProxmoxClient, node: str, vm_name: str, vcpus: int, memory_mb: int, image: str, iso_filename: str, tags: list, attempts: int = 3) -> str:
-    """/cluster/nextid is non-reserving, so concurrent creators (our own parallel
-    builds, or anything external) can claim the same vmid between our fetch and
-    create. The collision fails clean at config-create time (nothing is left
-    behind), so retry immediately: by the time the loser sees the error the
-    winner's config already exists, so the refetched nextid has moved on. Lock
-    timeouts are self-rate-limited (PVE waits ~10s internally before returning
-    them), so they retry immediately too."""
+# ----------------------- vmid allocation ----------------------- #
+
+_vmids_reserved = set()
+_vmids_in_use = set()
+_vmids_synced_at = None
+_vmid_lock = asyncio.Lock()
+_vmid_scan_offset = None
+
+
+def _vmid_range() -> range:
+    start, _, end = VMID_RANGE.partition("-")
+    return range(int(start), int(end) + 1)
+
+
+def _vmid_scan_order() -> list:
+    """The range rotated to this process's random starting offset."""
+    global _vmid_scan_offset
+    vmids = _vmid_range()
+    if _vmid_scan_offset is None:
+        _vmid_scan_offset = secrets.randbelow(len(vmids))
+    return [*vmids[_vmid_scan_offset:], *vmids[:_vmid_scan_offset]]
+
+
+def _create_attempts(parallel_builds: int) -> int:
+    # Without a local range every parallel build may collide with every other
+    # one on /cluster/nextid; with it, only external creators can.
+    return 3 if VMID_RANGE else 3 + 2 * parallel_builds
+
+
+async def _allocate_vmid(px: ProxmoxClient) -> str:
+    global _vmids_synced_at
+    if not VMID_RANGE:
+        return await px.get_next_vmid()
+    async with _vmid_lock:
+        if _vmids_synced_at is None or time.monotonic() - _vmids_synced_at > VMID_RESYNC_INTERVAL:
+            _vmids_in_use.clear()
+            _vmids_in_use.update(await _proxmox_api().list_cluster_vmids())
+            _vmids_synced_at = time.monotonic()
+        for vmid in _vmid_scan_order():
+            if vmid not in _vmids_in_use and vmid not in _vmids_reserved:
+                _vmids_reserved.add(vmid)
+                return str(vmid)
+    raise RuntimeError(f"No free vmid left in K3D_LB_VMID_RANGE={VMID_RANGE}")
+
+
+def _release_vmid(vmid, in_use: bool):
+    """Drop a reservation; in_use records that the id now belongs to a VM (ours or an external one)."""
+    if not VMID_RANGE:
+        return
+    _vmids_reserved.discard(int(vmid))
+    if in_use:
+        _vmids_in_use.add(int(vmid))
+
+
+async def _with_vmid_retry(px: ProxmoxClient, vm_name: str, create, attempts: int = 3) -> str:
+    """Run create(vmid) with a fresh vmid, retrying on vmid conflicts and lock timeouts.
+
+    With K3D_LB_VMID_RANGE set, vmids come from the local allocator and only an
+    external creator can collide with us. Otherwise /cluster/nextid is
+    non-reserving, so concurrent creators (our own parallel builds, or anything
+    external) can claim the same vmid between our fetch and create. The
+    collision fails clean at config-create time (nothing is left behind), so
+    retry immediately: by the time the loser sees the error the winner's config
+    already exists, so the refetched nextid has moved on. Lock timeouts are
+    self-rate-limited (PVE waits ~10s internally before returning them), so they
+    retry immediately too."""
     for attempt in range(attempts):
-        vmid = await px.get_next_vmid()
+        vmid = await _allocate_vmid(px)
         try:
-            await px.create_vm(
-                node=node,
-                vmid=vmid,
-                vm_name=vm_name,
-                vcpus=vcpus,
-                memory_mb=memory_mb,
-                image=image,
-                iso_filename=iso_filename,
-                tags=tags,
-                bridge=os.getenv("PROXMOX_BRIDGE", "vmbr_public"),
-                vlan_tag=os.getenv("PROXMOX_VLAN_TAG") or None,
-            )
-            return vmid
+            await create(vmid)
         except (httpx.HTTPStatusError, RuntimeError) as e:
+            _release_vmid(vmid, in_use=_is_vmid_conflict(e))
             if attempt < attempts - 1 and (_is_vmid_conflict(e) or _is_transient_lock_timeout(e)):
                 reason = "was taken by a concurrent create" if _is_vmid_conflict(e) else "hit a transient Proxmox lock timeout"
                 logger.warning(f"vmid {vmid} {reason}, retrying {vm_name} immediately")
                 continue
             raise
+        except BaseException:
+            _release_vmid(vmid, in_use=False)
+            raise
+        _release_vmid(vmid, in_use=True)
+        return vmid
+
+
+async def _create_vm_with_vmid_retry(px: ProxmoxClient, node: str, vm_name: str, vcpus: int, memory_mb: int, image: str, iso_filename: str, tags: list, attempts: int = 3) -> str:
+    async def create(vmid):
+        await _scheduled(node, "create_vm", lambda: px.create_vm(
+            node=node,
+            vmid=vmid,
+            vm_name=vm_name,
+            vcpus=vcpus,
+            memory_mb=memory_mb,
+            image=image,
+            iso_filename=iso_filename,
+            tags=tags,
+            bridge=os.getenv("PROXMOX_BRIDGE", "vmbr_public"),
+            vlan_tag=os.getenv("PROXMOX_VLAN_TAG") or None,
+        ))
+
+    return await _with_vmid_retry(px, vm_name, create, attempts)
+
+
+async def _image_cache_key(px: ProxmoxClient, refresh: bool = False):
+    """(image, checksum, cache_name) for the configured VM image; refresh re-reads SHA256SUMS."""
+    image = os.getenv("K3D_LB_VM_IMAGE", "tools-api-k3d-lb-chisel-debian-13-amd64")
+    checksum = await _cached(
+        ("sha256", px.download_server_url, image),
+        lambda: _fetch_expected_sha256(px.download_server_url, f"{image}.qcow2"),
+        refresh,
+    )
+    # Cache under a checksum-derived name so a node re-downloads when the
+    # release changes instead of reusing whatever it first cached forever.
+    cache_name = f"{image}-{checksum[:12]}" if checksum else image
+    return image, checksum, cache_name
+
+
+# In-flight image downloads keyed by (node, cache_name), shared by create
+# requests, warm-pool builds and the image manager so a node never downloads
+# the same release twice concurrently.
+_image_cache_tasks = {}
+
+
+def _ensure_image_cached(node: str, image: str, checksum, cache_name: str) -> asyncio.Future:
+    key = (node, cache_name)
+    task = _image_cache_tasks.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            _proxmox().ensure_image_cached(node, image, checksum=checksum, cache_name=cache_name),
+            context=metrics.detached_context(),
+        )
+        _image_cache_tasks[key] = task
+        task.add_done_callback(lambda t: _image_cache_tasks.pop(key, None))
+    # Shielded: a cancelled request must not abort a download others are waiting on.
+    return asyncio.shield(task)
+
+
+# ----------------------- Linked clones ----------------------- #
+
+# Nodes whose storage refused a linked clone or template; they use full imports.
+_linked_clone_unsupported = set()
+# In-flight template builds keyed by (node, cache_name, slot id).
+_template_tasks = {}
+
+
+def _slot_tag(slot: dict) -> str:
+    return f"slot-{str(slot['id']).lower()}"
+
+
+def _template_name(node: str, cache_name: str, slot: dict) -> str:
+    digest = hashlib.sha256(f"{cache_name}/{slot['id']}".encode()).hexdigest()[:8]
+    return f"k3d-lb-template-{node}-{digest}".lower()
+
+
+# Proxmox's refusals to link-clone, e.g. "Linked clone feature is not supported for drive
+# 'scsi0'" or "clone_image only works on base images"; anything else is a real failure.
+_CLONE_UNSUPPORTED_RE = re.compile(r"linked clone feature|clone feature is not (supported|available)|only works on base images|base volume")
+
+
+def _is_clone_unsupported(e: Exception) -> bool:
+    text = e.response.text if isinstance(e, httpx.HTTPStatusError) else str(e)
+    return _CLONE_UNSUPPORTED_RE.search(text.lower()) is not None
+
+
+async def _find_template(node: str, tags: list):
+    for vm in await _proxmox_api().list_cluster_vms():
+        if vm["node"] == node and vm["template"] and set(tags) <= set(vm["tags"]):
+            return vm
+    return None
+
+
+async def _create_template(node: str, cache_name: str, slot: dict, cached_image: str, create_attempts: int) -> dict:
+    px = _proxmox()
+    tags = [CREATOR_TAG, MANAGED_TAG, TEMPLATE_TAG, cache_name.lower(), _slot_tag(slot)]
+    existing = await _find_template(node, tags)
+    if existing:
+        return {"vmid": existing["vmid"], "iso_filename": _iso_filename(existing["name"])}
+
+    template_name = _template_name(node, cache_name, slot)
+    logger.info(f"Building k3d-lb template {template_name} on {node} from {cache_name}")
+    # The template never boots; the ISO only gives it (and so every clone) a
+    # cdrom drive that each clone then repoints at its own cloud-init ISO.
+    iso_filename = await _upload_cloudinit_iso(px, node, template_name, _user_data().encode())
+    vmid = await _create_vm_with_vmid_retry(
+        px,
+        node=node,
+        vm_name=template_name,
+        vcpus=slot["vcpu"],
+        memory_mb=slot["ram_gb"] * 1024,
+        image=cached_image,
+        iso_filename=iso_filename,
+        tags=tags,
+        attempts=create_attempts,
+    )
+    try:
+        await _proxmox_api().convert_to_template(node, vmid)
+    except Exception:
+        await px.delete_vm(node, vmid)
+        raise
+    return {"vmid": vmid, "iso_filename": iso_filename}
+
+
+def _ensure_template(node: str, cache_name: str, slot: dict, cached_image: str, create_attempts: int) -> asyncio.Future:
+    key = (node, cache_name, slot["id"])
+    task = _template_tasks.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            _create_template(node, cache_name, slot, cached_image, create_attempts), context=metrics.detached_context()
+        )
+        _template_tasks[key] = task
+        task.add_done_callback(lambda t: _template_tasks.pop(key, None))
+    return asyncio.shield(task)
+
+
+async def _prune_templates(keep_cache_name: str):
+    """Delete our templates built from any image release other than keep_cache_name.
+
+    A template still backing linked clones can't be deleted; it is retried on a later
+    prune once those VMs are gone.
+    """
+    px = _proxmox()
+    try:
+        vms = await _proxmox_api().list_cluster_vms()
+    except Exception as e:
+        logger.warning(f"Stale template prune failed: {e}")
+        return
+    for vm in vms:
+        tags = set(vm["tags"])
+        if not vm["template"] or not {CREATOR_TAG, MANAGED_TAG, TEMPLATE_TAG} <= tags or keep_cache_name.lower() in tags:
+            continue
+        try:
+            await px.delete_vm(vm["node"], vm["vmid"])
+            await px.delete_isos_matching(re.escape(_iso_filename(vm["name"])))
+            logger.info(f"Deleted stale k3d-lb template {vm['name']} on {vm['node']}")
+        except Exception as e:
+            logger.info(f"Stale k3d-lb template {vm['name']} on {vm['node']} not deleted yet: {e}")
+
+
+async def _clone_vm(px: ProxmoxClient, node: str, vm_name: str, iso_filename: str, tags: list, slot: dict, template: dict, create_attempts: int) -> str:
+    """Linked-clone the node's template, then give the clone its own tags and cloud-init ISO."""
+    api = _proxmox_api()
+    vmid = await _with_vmid_retry(
+        px, vm_name, lambda newid: _scheduled(node, "clone_vm", lambda: api.clone_vm(node, template["vmid"], newid, vm_name)), create_attempts,
+    )
+    try:
+        config = await api.vm_config(node, vmid)
+        drives = {
+            key: value.replace(template["iso_filename"], iso_filename)
+            for key, value in config.items()
+            if isinstance(value, str) and template["iso_filename"] in value
+        }
+        await api.set_vm_config(node, vmid, tags=tags, **drives)
+        await _scheduled(node, "resize_disk", lambda: px.resize_disk(node, vmid, slot["disk_gb"]))
+    except Exception:
+        await _scheduled(node, "delete_vm", lambda: px.delete_vm(node, vmid))
+        raise
+    return vmid
+
+
+async def _build_vm(px: ProxmoxClient, node: str, vm_name: str, user_data: bytes, tags: list, slot: dict, cached_image: str, create_attempts: int, cache_name: str = None, hostname: str = None) -> dict:
+    """Upload the cloud-init ISO, create (or linked-clone), resize and start one VM on node.
+
+    cache_name identifies the image release; linked clones are only attempted when it is given.
+    hostname is the guest's (default: vm_name), for a VM built under a temporary name.
+    """
+    iso_filename = await _upload_cloudinit_iso(px, node, vm_name, user_data, hostname)
+    _report(vm_name, "iso_uploaded", hypervisor=node)
+    if LINKED_CLONES and cache_name and node not in _linked_clone_unsupported:
+        vmid = None
+        try:
+            with metrics.timed("template_wait", node):
+                template = await _ensure_template(node, cache_name, slot, cached_image, create_attempts)
+            vmid = await _clone_vm(px, node, vm_name, iso_filename, tags, slot, template, create_attempts)
+        except Exception as e:
+            if _is_clone_unsupported(e):
+                _linked_clone_unsupported.add(node)
+                logger.warning(f"Storage on {node} can't do linked clones ({e}); using full imports there from now on")
+            else:
+                logger.warning(f"Linked clone of {vm_name} on {node} failed ({e}); falling back to a full import")
+        if vmid is not None:
+            # The clone exists now: a failed start must not fall back to a
+            # second VM of the same name, so the clone is deleted instead.
+            _report(vm_name, "created", hypervisor=node, vmid=vmid, linked_clone=True)
+            try:
+                await _scheduled(node, "start_vm", lambda: px.start_vm(node, vmid))
+            except Exception:
+                await _scheduled(node, "delete_vm", lambda: px.delete_vm(node, vmid))
+                raise
+            _report(vm_name, "started", hypervisor=node, vmid=vmid)
+            return {"vm_name": vm_name, "node": node, "vmid": vmid, "iso_filename": iso_filename}
+    vmid = await _create_vm_with_vmid_retry(
+        px,
+        node=node,
+        vm_name=vm_name,
+        vcpus=slot["vcpu"],
+        memory_mb=slot["ram_gb"] * 1024,
+        image=cached_image,
+        iso_filename=iso_filename,
+        tags=tags,
+        attempts=create_attempts,
+    )
+    await _scheduled(node, "resize_disk", lambda: px.resize_disk(node, vmid, slot["disk_gb"]))
+    _report(vm_name, "created", hypervisor=node, vmid=vmid, linked_clone=False)
+    await _scheduled(node, "start_vm", lambda: px.start_vm(node, vmid))
+    _report(vm_name, "started", hypervisor=node, vmid=vmid)
+    return {"vm_name": vm_name, "node": node, "vmid": vmid, "iso_filename": iso_filename}
+
+
+# ----------------------- Hedged builds ----------------------- #
+
+# Durations of recent successful builds, for the hedge trigger.
+_build_samples = collections.deque(maxlen=100)
+# captain_domain -> losing builds still being torn down. The next create or
+# delete for the domain waits for them under its lock (_await_hedge_teardowns),
+# so none of them deletes a VM or pool out from under it.
+_hedge_teardowns = {}
+
+
+def _hedge_delay() -> float:
+    if len(_build_samples) < 10:
+        return HEDGE_DELAY
+    return statistics.quantiles(_build_samples, n=100)[min(int(HEDGE_PERCENTILE), 99) - 1]
+
+
+async def _tear_down_hedge_loser(task: asyncio.Task, vm_name: str, pool_id=None):
+    """Wait for the losing build, delete its VM, and release its hedge pool if it had one.
+
+    Its cloud-init ISO is left to the orphan sweep: a later build of the same
+    node may already be reusing the filename.
+    """
+    try:
+        vm = await task
+    except Exception as e:
+        logger.info(f"Losing hedged build of {vm_name} failed ({e}); nothing to tear down")
+    else:
+        try:
+            await _delete_vm_with_retry(_proxmox(), {"name": vm["vm_name"], "node": vm["node"], "vmid": vm["vmid"]})
+        except Exception as e:
+            logger.error(f"Could not delete losing hedged build {vm['vm_name']} (vmid {vm['vmid']} on {vm['node']}): {e}")
+            return
+    if pool_id is not None:
+        await _waggle().delete_pool(pool_id)
+
+
+async def _await_hedge_teardowns(captain_domain: str):
+    """Called under the domain lock before any create/delete touches VMs or pools."""
+    teardowns = _hedge_teardowns.get(captain_domain)
+    if teardowns:
+        logger.info(f"Waiting for {len(teardowns)} losing hedged build(s) of {captain_domain} to be torn down")
+        await asyncio.wait(set(teardowns))
+
+
+async def _hedged_build(captain_domain: str, suffix: str, placement: dict, build_on, datacenter: dict, slot: dict) -> dict:
+    """build_on(placement, hedge) with a hedge on an alternate placement if it is slow or fails.
+
+    The hedge is built as <vm_name>-hedge, so it can't be mistaken for the
+    primary, and only takes vm_name once it wins.
+    """
+    vm_name = f"{captain_domain}-{suffix}"
+    waggle = _waggle()
+    primary = asyncio.create_task(build_on(placement, False))
+    done, _ = await asyncio.wait({primary}, timeout=_hedge_delay())
+    if done and primary.exception() is None:
+        return primary.result()
+
+    try:
+        hedge_pool = await waggle.create_pool(datacenter["id"], slot["id"], _pool_name(captain_domain), 1)
+        hedge_placement = (await waggle.get_pool_placements(hedge_pool["id"]))[0]
+    except Exception as e:
+        logger.warning(f"No alternate placement for {vm_name}: {e}")
+        return await primary
+    if primary.done() and primary.exception() is None:
+        # Finished while the alternate placement was being made.
+        await waggle.delete_pool(hedge_pool["id"])
+        return primary.result()
+    if hedge_placement["hypervisor_name"] == placement["hypervisor_name"] and not primary.done():
+        logger.info(f"Waggle's alternate placement for {vm_name} is the same hypervisor; not hedging")
+        await waggle.delete_pool(hedge_pool["id"])
+        return await primary
+
+    logger.warning(
+        f"Build of {vm_name} on {placement['hypervisor_name']} {'failed' if done else 'is slow'}; "
+        f"hedging on {hedge_placement['hypervisor_name']} (placement {hedge_placement['id']})"
+    )
+    hedge = asyncio.create_task(build_on(hedge_placement, True))
+    remaining, winner = {primary, hedge}, None
+    while remaining and winner is None:
+        done, remaining = await asyncio.wait(remaining, return_when=asyncio.FIRST_COMPLETED)
+        winner = next((t for t in done if t.exception() is None), None)
+
+    if winner is None:
+        await waggle.delete_pool(hedge_pool["id"])
+        raise RuntimeError(f"primary build failed ({primary.exception()}); hedged build failed ({hedge.exception()})")
+    # A loser that built (or may still build) a VM is torn down once it finishes;
+    # a losing hedge always releases its pool. Both can finish in the same round,
+    # so a finished loser that succeeded is torn down too.
+    loser = hedge if winner is primary else primary
+    if loser is hedge or not loser.done() or loser.exception() is None:
+        teardown = asyncio.create_task(
+            _tear_down_hedge_loser(loser, vm_name, hedge_pool["id"] if loser is hedge else None),
+            context=metrics.detached_context(),
+        )
+        teardowns = _hedge_teardowns.setdefault(captain_domain, set())
+        teardowns.add(teardown)
+
+        def _done(t):
+            teardowns.discard(t)
+            if not teardowns and _hedge_teardowns.get(captain_domain) is teardowns:
+                del _hedge_teardowns[captain_domain]
+
+        teardown.add_done_callback(_done)
+    vm = winner.result()
+    if winner is hedge:
+        await _proxmox_api().set_vm_config(vm["node"], vm["vmid"], name=vm_name)
+        vm["vm_name"] = vm_name
+    logger.info(f"{'Hedged' if winner is hedge else 'Primary'} build of {vm_name} won")
+    return vm
+
+
+# ----------------------- IP discovery ----------------------- #
+
+# Seconds from discovery start to a usable IP for recently built VMs; the
+# median paces the polling of the next builds.
+_ip_ready_samples = collections.deque(maxlen=50)
+# Discoveries that outlive a quorum response, and the manifest fill-ins waiting
+# on them (strong refs until they finish).
+_background_discoveries = set()
+
+# Interfaces that never carry the VM's own address (docker runs on the image).
+_IGNORED_INTERFACE_PREFIXES = ("lo", "docker", "br-", "veth")
+
+
+def _pick_ipv4(interfaces: list):
+    for iface in interfaces:
+        if iface.get("name", "").startswith(_IGNORED_INTERFACE_PREFIXES):
+            continue
+        for addr in iface.get("ip-addresses") or []:
+            if addr.get("ip-address-type") != "ipv4":
+                continue
+            ip = ipaddress.ip_address(addr["ip-address"])
+            if not (ip.is_loopback or ip.is_link_local):
+                return str(ip)
+    return None
+
+
+def _next_poll_delay(elapsed: float, expected) -> float:
+    """Sparse polls well before the VM is expected to be ready, tight ones around it, then back off."""
+    if expected is None:
+        return 1.0
+    if elapsed < 0.8 * expected:
+        return max(1.0, (0.8 * expected - elapsed) / 2)
+    if elapsed < 1.5 * expected:
+        return 1.0
+    return min(5.0, 1.0 + (elapsed - 1.5 * expected) / 10)
+
+
+async def _discover_ip(vm: dict, learn: bool) -> str:
+    """Poll the guest agent for vm's IPv4; fail fast once the VM is no longer running.
+
+    learn records the time to a usable IP, for VMs that were just started.
+    """
+    api = _proxmox_api()
+    expected = statistics.median(_ip_ready_samples) if _ip_ready_samples else None
+    started = time.monotonic()
+    with metrics.timed("ip_discovery", vm["node"]):
+        while True:
+            ip = None
+            try:
+                try:
+                    ip = _pick_ipv4(await api.agent_network_interfaces(vm["node"], vm["vmid"]))
+                except httpx.HTTPStatusError:
+                    # Agent not up yet, or the VM is gone: only the latter is fatal.
+                    status = await api.vm_status(vm["node"], vm["vmid"])
+                    if status != "running":
+                        raise RuntimeError(f"VM is {status}, not running")
+            except httpx.TransportError as e:
+                # The API (or the agent proxy behind it) dropped or timed out the
+                # call: treated as not up yet, until IP_DISCOVERY_TIMEOUT.
+                logger.debug(f"IP discovery for {vm['vm_name']} (vmid {vm['vmid']}): {e!r}; retrying")
+            elapsed = time.monotonic() - started
+            if ip:
+                break
+            if elapsed > IP_DISCOVERY_TIMEOUT:
+                raise TimeoutError(f"no IPv4 from the guest agent within {IP_DISCOVERY_TIMEOUT:.0f}s")
+            await asyncio.sleep(_next_poll_delay(elapsed, expected))
+    if learn:
+        _ip_ready_samples.append(elapsed)
+    _report(vm["vm_name"], "ip_discovered", hypervisor=vm["node"], vmid=vm["vmid"], ip=ip)
+    return ip
+
+
+async def _discover_ips(vms: list, learn: set, quorum: int):
+    """({vm_name: ip}, rest) once quorum VMs have IPs; raises as soon as quorum can't be met.
+
+    Discoveries still pending at that point keep running in the background; rest
+    is a task resolving to {vm_name: ip} of those that succeed (None if there
+    were none left), for _fill_in_manifest.
+    """
+    tasks = {asyncio.create_task(_discover_ip(vm, vm["vm_name"] in learn)): vm for vm in vms}
+    pending = set(tasks)
+    ip_addresses, failures = {}, []
+    try:
+        while pending and len(ip_addresses) < quorum and len(vms) - len(failures) >= quorum:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                vm = tasks[task]
+                if task.exception() is not None:
+                    failures.append(f"{vm['vm_name']} (vmid {vm['vmid']}): {task.exception()}")
+                else:
+                    ip_addresses[vm["vm_name"]] = task.result()
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        raise
+
+    if len(ip_addresses) < quorum:
+        for task in pending:
+            task.cancel()
+        raise RuntimeError(f"IP discovery failed for {len(failures)}/{len(vms)} node(s): " + "; ".join(failures))
+
+    if not pending:
+        return ip_addresses, None
+
+    async def rest() -> dict:
+        pending_list = list(pending)
+        found = {}
+        for task, result in zip(pending_list, await asyncio.gather(*pending_list, return_exceptions=True)):
+            vm = tasks[task]
+            if isinstance(result, asyncio.CancelledError):
+                continue
+            if isinstance(result, BaseException):
+                logger.error(f"Background IP discovery for {vm['vm_name']} (vmid {vm['vmid']}) failed: {result}")
+            else:
+                logger.info(f"Background IP discovery: {vm['vm_name']} is at {result}")
+                found[vm["vm_name"]] = result
+        return found
+
+    rest_task = asyncio.create_task(rest(), context=metrics.detached_context())
+    _background_discoveries.add(rest_task)
+    rest_task.add_done_callback(_background_discoveries.discard)
+    return ip_addresses, rest_task
+
+
+def _manifest(captain_domain: str, credentials_for_chisel, ip_addresses: dict, suffixes: list, all_vms: list):
+    """(chisel manifest, stored node list) for the nodes in ip_addresses."""
+    ready = [suffix for suffix in suffixes if f"{captain_domain}-{suffix}" in ip_addresses]
+    manifest = util.chisel.create_chisel_yaml(captain_domain, credentials_for_chisel, ip_addresses, ready)
+    nodes = [{"name": vm["vm_name"], "node": vm["node"], "vmid": str(vm["vmid"])} for vm in all_vms if vm["vm_name"] in ip_addresses]
+    return manifest, nodes
+
+
+async def _fill_in_manifest(captain_domain: str, rest: asyncio.Task, credentials_for_chisel, ip_addresses: dict, suffixes: list, all_vms: list, saved_nodes: list):
+    """Once a quorum create's remaining discoveries finish, store the manifest with every node found.
+
+    Skipped if the stored entry is no longer the one that create saved (a newer
+    create or a delete got there first).
+    """
+    found = await rest
+    if not found or not result_store.enabled():
+        return
+    manifest, nodes = _manifest(captain_domain, credentials_for_chisel, {**ip_addresses, **found}, suffixes, all_vms)
+    try:
+        async with _domain_lock(captain_domain):
+            stored = await asyncio.to_thread(result_store.load, "k3d-lb", captain_domain)
+            if stored is None or stored[1] != saved_nodes:
+                logger.info(f"Stored k3d-lb manifest for {captain_domain} changed since the quorum response; not filling it in")
+                return
+            await asyncio.to_thread(result_store.save, "k3d-lb", captain_domain, manifest, nodes)
+    except Exception as e:
+        logger.error(f"Could not fill in the stored k3d-lb manifest for {captain_domain}: {e}")
+        return
+    logger.info(f"Stored k3d-lb manifest for {captain_domain} now lists {len(nodes)}/{len(all_vms)} node(s)")
 
 
-async def create_nodes(request) -> str:
+async def create_nodes(request, progress=None) -> str:
+    """Create (or replace/reconcile) the k3d-lb nodes and return the chisel manifest.
+
+    progress, if given, is called with a dict per node phase (placement,
+    image_cached, iso_uploaded, created, started, ip_discovered; kept/claimed
+    for reused VMs). With request.quorum, the manifest lists only the nodes
+    whose IP was known by then; the stored manifest (GET) is filled in with the
+    rest as their IPs come in.
+    """
+    if progress is not None:
+        _progress.set(progress)
     # Lowercase up front: Proxmox lowercases tags on write, so every derived name
     # (tags, VM names, ISO filenames, pool name) must agree for delete to find them.
     captain_domain = request.captain_domain.strip().lower()
@@ -258,102 +1071,161 @@ async def create_nodes(request) -> str:
     waggle = _waggle()
     async with _domain_lock(captain_domain):
         logger.info(f"Starting k3d-lb node creation for captain_domain: {captain_domain}")
+        # Nodes or credentials may change from here on, even if this create fails.
+        await asyncio.to_thread(result_store.forget, "k3d-lb", captain_domain)
 
-        credentials_for_chisel = util.chisel.generate_credentials()
         suffixes = util.chisel.get_suffixes(node_count)
-        image = os.getenv("K3D_LB_VM_IMAGE", "tools-api-k3d-lb-chisel-debian-13-amd64")
-        checksum = await _fetch_expected_sha256(px.download_server_url, f"{image}.qcow2")
-        # Cache under a checksum-derived name so a node re-downloads when the
-        # release changes instead of reusing whatever it first cached forever.
-        cache_name = f"{image}-{checksum[:12]}" if checksum else image
 
-        datacenter = await waggle.get_datacenter_by_name(os.environ["WAGGLE_DATACENTER_NAME"])
-        slot = await waggle.get_slot_by_name(os.environ["WAGGLE_SLOT_NAME"])
+        # The Waggle lookups validate the configuration, so they finish before
+        # anything is deleted: a bad datacenter/slot must not cost working nodes.
+        # Both are TTL-cached, so this rarely adds a round-trip.
+        datacenter, slot = await asyncio.gather(_waggle_datacenter(), _waggle_slot())
+
+        if request.reconcile:
+            # Keep healthy nodes, drop the rest, and only build the difference.
+            existing = _reconcile_existing_locked(captain_domain, suffixes, request.rotate_credentials)
+        else:
+            # Idempotent replace: drop any existing nodes + pool for this captain_domain
+            existing = _delete_nodes_locked(captain_domain)
+
+        # The image key and the delete/reconcile are independent, so overlap them.
+        # Both run to completion before a failure is raised, so no delete is
+        # still running once the domain lock is released.
+        setup = await asyncio.gather(_image_cache_key(px), existing, return_exceptions=True)
+        for r in setup:
+            if isinstance(r, BaseException):
+                raise r
+        (image, checksum, cache_name), existing = setup
+
+        kept, stale_isos = {}, []
+        if request.reconcile:
+            kept, credentials_for_chisel, stale_isos = existing
+        else:
+            credentials_for_chisel = util.chisel.generate_credentials()
+
+        # Pre-booted warm VMs cover as many missing suffixes as the pool can; the
+        # rest are built from scratch below.
+        missing = [suffix for suffix in suffixes if suffix not in kept]
+        claimed = await _claim_warm_vms(captain_domain, missing, credentials_for_chisel)
+        for vm in kept.values():
+            _report(vm["vm_name"], "kept", hypervisor=vm["node"], vmid=vm["vmid"])
+        for vm in claimed.values():
+            _report(vm["vm_name"], "claimed", hypervisor=vm["node"], vmid=vm["vmid"])
+        cold_suffixes = [suffix for suffix in missing if suffix not in claimed]
+        old_pools, rebased = await _pools_to_rebase(captain_domain, kept, cold_suffixes) if kept else ([], [])
 
-        # Idempotent replace: drop any existing nodes + pool for this captain_domain
-        await _delete_nodes_locked(captain_domain)
-
-        pool = await waggle.create_pool(datacenter["id"], slot["id"], _pool_name(captain_domain), node_count)
         try:
-            placements = await waggle.get_pool_placements(pool["id"])
-            if len(placements) != node_count:
-                raise RuntimeError(f"Waggle returned {len(placements)} placements for pool {pool['id']}, expected {node_count}")
-
-            # Build all VMs concurrently. vmid collisions between our own builds
-            # (or external creators) fail clean at config-create time and are
-            # retried with backoff inside _create_vm_with_vmid_retry, so no lock
-            # is needed. The image-cache step is deduped per node via a shared
-            # task that every build on that node awaits.
-            cache_tasks = {}
-            for placement in placements:
-                node = placement["hypervisor_name"]
-                if node not in cache_tasks:
-                    cache_tasks[node] = asyncio.create_task(
-                        px.ensure_image_cached(node, image, checksum=checksum, cache_name=cache_name)
+            vms = []
+            if cold_suffixes or rebased:
+                pool_size = len(cold_suffixes) + len(rebased)
+                started, placements = time.monotonic(), []
+                try:
+                    pool = await waggle.create_pool(datacenter["id"], slot["id"], _pool_name(captain_domain), pool_size)
+                    placements = await waggle.get_pool_placements(pool["id"])
+                finally:
+                    # One pool spans hypervisors: recorded under each one it placed on.
+                    for node in sorted({p["hypervisor_name"] for p in placements}) or [""]:
+                        metrics.observe("waggle_placement", node, time.monotonic() - started)
+                if len(placements) != pool_size:
+                    raise RuntimeError(f"Waggle returned {len(placements)} placements for pool {pool['id']}, expected {pool_size}")
+                placements = _assign_placements(placements, rebased)
+
+                # Build all VMs concurrently; the Proxmox calls themselves queue on
+                # the per-node scheduler (_scheduled). vmid collisions fail clean at
+                # config-create time and are retried inside _with_vmid_retry. The
+                # image-cache step is deduped per node via a shared task that every
+                # build on that node awaits.
+                cache_tasks = {}
+                for placement in placements:
+                    node = placement["hypervisor_name"]
+                    if node not in cache_tasks:
+                        cache_tasks[node] = _ensure_image_cached(node, image, checksum, cache_name)
+                create_attempts = _create_attempts(len(cold_suffixes))
+                user_data = _user_data(credentials_for_chisel).encode()
+
+                async def build_on(suffix, placement, hedge=False) -> dict:
+                    node = placement["hypervisor_name"]
+                    # A hedge runs under its own name (and ISO) until it wins; see _hedged_build.
+                    hostname = f"{captain_domain}-{suffix}"
+                    vm_name = f"{hostname}-hedge" if hedge else hostname
+                    logger.info(f"Creating k3d-lb node {vm_name} on hypervisor {node} (placement {placement['id']})")
+                    _report(vm_name, "placement", hypervisor=node, placement=placement["id"], hedge=hedge)
+                    started = time.monotonic()
+                    with metrics.timed("image_cache_wait", node):
+                        if node not in cache_tasks:
+                            cache_tasks[node] = _ensure_image_cached(node, image, checksum, cache_name)
+                        cached_image = await cache_tasks[node]
+                    _report(vm_name, "image_cached", hypervisor=node)
+                    vm = await _build_vm(
+                        px, node, vm_name, user_data, [CREATOR_TAG, MANAGED_TAG, captain_domain],
+                        slot, cached_image, create_attempts, cache_name, hostname,
                     )
-            create_attempts = 3 + 2 * node_count
-
-            async def build(suffix, placement) -> dict:
-                node = placement["hypervisor_name"]
-                vm_name = f"{captain_domain}-{suffix}"
-                logger.info(f"Creating k3d-lb node {vm_name} on hypervisor {node} (placement {placement['id']})")
-                cached_image = await cache_tasks[node]
-                iso_bytes = build_cloudinit_iso(
-                    _user_data(credentials_for_chisel).encode(),
-                    _meta_data(vm_name).encode(),
-                )
-                iso_filename = await px.upload_iso(node, _iso_filename(vm_name), iso_bytes)
-                vmid = await _create_vm_with_vmid_retry(
-                    px,
-                    node=node,
-                    vm_name=vm_name,
-                    vcpus=slot["vcpu"],
-                    memory_mb=slot["ram_gb"] * 1024,
-                    image=cached_image,
-                    iso_filename=iso_filename,
-                    tags=[CREATOR_TAG, MANAGED_TAG, captain_domain],
-                    attempts=create_attempts,
+                    _build_samples.append(time.monotonic() - started)
+                    # Recorded in Waggle in one batch once the builds are done
+                    # (only the winner of a hedged build gets its placement set).
+                    vm["placement_id"] = placement["id"]
+                    return vm
+
+                async def build(suffix, placement) -> dict:
+                    if HEDGE_PERCENTILE <= 0:
+                        return await build_on(suffix, placement)
+                    return await _hedged_build(
+                        captain_domain, suffix, placement,
+                        lambda p, hedge: build_on(suffix, p, hedge), datacenter, slot,
+                    )
+
+                build_results = await asyncio.gather(
+                    *(build(suffix, placement) for suffix, placement in zip(cold_suffixes, placements)),
+                    return_exceptions=True,
                 )
-                await px.resize_disk(node, vmid, slot["disk_gb"])
-                await px.start_vm(node, vmid)
-                await waggle.set_placement_vmid(placement["id"], int(vmid))
-                return {"vm_name": vm_name, "node": node, "vmid": vmid, "iso_filename": iso_filename}
-
-            build_results = await asyncio.gather(
-                *(build(suffix, placement) for suffix, placement in zip(suffixes, placements)),
-                return_exceptions=True,
-            )
-            build_failures = [
-                f"{captain_domain}-{suffix}: {r}"
-                for suffix, r in zip(suffixes, build_results) if isinstance(r, BaseException)
-            ]
-            if build_failures:
-                raise RuntimeError(f"VM build failed for {len(build_failures)}/{len(placements)} node(s): " + "; ".join(build_failures))
-            vms = list(build_results)
-
-            # Return as soon as every VM's IP is known: the guest agent comes up
-            # during cloud-init's package phase, well before the docker install
-            # finishes, and the chisel operator retries until the server is
-            # reachable — same semantics as the Hetzner endpoint, which returns
-            # before its VMs have even booted. get_vm_ipv4 polls through
-            # agent-not-yet-running errors, so it alone gates on agent + DHCP.
-            results = await asyncio.gather(
-                *(px.get_vm_ipv4(vm["node"], vm["vmid"], timeout=300) for vm in vms),
-                return_exceptions=True,
+                build_failures = [
+                    f"{captain_domain}-{suffix}: {r}"
+                    for suffix, r in zip(cold_suffixes, build_results) if isinstance(r, BaseException)
+                ]
+                vms = [r for r in build_results if not isinstance(r, BaseException)]
+                if build_failures:
+                    # The VMs that did build still hold their placements. The old pools
+                    # stay too; the next reconcile folds them in again.
+                    try:
+                        await _set_placement_vmids(vms + rebased)
+                    except Exception as e:
+                        logger.error(f"Could not record the Waggle placements of {captain_domain}'s k3d-lb nodes: {e}")
+                    raise RuntimeError(f"VM build failed for {len(build_failures)}/{len(placements)} node(s): " + "; ".join(build_failures))
+            all_vms = list(kept.values()) + list(claimed.values()) + vms
+
+            # Return as soon as every VM's IP is known (or quorum of them): the
+            # guest agent comes up during cloud-init's package phase, well before
+            # the docker install finishes, and the chisel operator retries until
+            # the server is reachable — same semantics as the Hetzner endpoint,
+            # which returns before its VMs have even booted. Claimed warm and kept
+            # VMs are already running, so theirs return at once.
+            # The Waggle placement updates overlap IP discovery.
+            # A failed placement update is only logged: the VMs are up, and Waggle
+            # merely under-reports them until the next replace or DELETE.
+            async def replace_placements():
+                try:
+                    await _replace_placements(vms + rebased, old_pools)
+                except Exception as e:
+                    logger.error(f"Could not record the Waggle placements of {captain_domain}'s k3d-lb nodes: {e}")
+
+            quorum = min(request.quorum or len(all_vms), len(all_vms))
+            placing = asyncio.create_task(replace_placements())
+            try:
+                ip_addresses, rest = await _discover_ips(all_vms, {vm["vm_name"] for vm in vms}, quorum)
+            finally:
+                await placing
+            logger.info(
+                f"{len(ip_addresses)}/{len(all_vms)} k3d-lb nodes ready ({len(kept)} kept, {len(claimed)} from the warm pool, {len(vms)} built). "
+                f"IP addresses: {ip_addresses}"
             )
-            failures = [
-                f"{vm['vm_name']} (vmid {vm['vmid']}): {r}"
-                for vm, r in zip(vms, results) if isinstance(r, BaseException)
-            ]
-            if failures:
-                raise RuntimeError(f"IP discovery failed for {len(failures)}/{len(vms)} node(s): " + "; ".join(failures))
-            ip_addresses = {vm["vm_name"]: ip for vm, ip in zip(vms, results)}
-            logger.info(f"All k3d-lb nodes created successfully. IP addresses: {ip_addresses}")
 
             # Cloud-init wait + ISO eject/delete happen in the background so the
             # response isn't gated on the docker install. If this task dies, the
             # orphan-ISO sweep in delete_nodes cleans up on the next POST/DELETE.
-            _spawn_cleanup(captain_domain, _finalize_cleanup(captain_domain, vms, cache_name))
+            # Warm VMs had their ISO removed before they became claimable; kept
+            # VMs are only included when their previous cleanup was cut short.
+            if vms or stale_isos:
+                await _schedule_cleanup(captain_domain, vms + stale_isos, cache_name)
         except Exception as e:
             logger.error(f"Error creating k3d-lb nodes for {captain_domain}: {str(e)}")
             raise HTTPException(status_code=500, detail=(
@@ -362,7 +1234,261 @@ async def create_nodes(request) -> str:
                 "re-run POST /v1/k3d-lb-nodes to replace them, or DELETE /v1/k3d-lb-nodes to clean up."
             )) from e
 
-        return util.chisel.create_chisel_yaml(captain_domain, credentials_for_chisel, ip_addresses, suffixes)
+        manifest, nodes = _manifest(captain_domain, credentials_for_chisel, ip_addresses, suffixes, all_vms)
+        await asyncio.to_thread(result_store.save, "k3d-lb", captain_domain, manifest, nodes)
+        if rest is not None:
+            # Runs once this create has released the domain lock.
+            fill_in = asyncio.create_task(
+                _fill_in_manifest(captain_domain, rest, credentials_for_chisel, ip_addresses, suffixes, all_vms, nodes),
+                context=metrics.detached_context(),
+            )
+            _background_discoveries.add(fill_in)
+            fill_in.add_done_callback(_background_discoveries.discard)
+        return manifest
+
+
+async def last_manifest(captain_domain: str) -> str:
+    """The last chisel manifest generated for captain_domain, if all of its VMs still run."""
+    captain_domain = captain_domain.strip().lower()
+    stored = await asyncio.to_thread(result_store.load, "k3d-lb", captain_domain)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No stored k3d-lb manifest for {captain_domain}; POST /v1/k3d-lb-nodes to create nodes.")
+    manifest, nodes = stored
+    # One cluster-wide listing instead of a status call per VM.
+    running = {
+        (vm["name"], vm["node"], vm["vmid"]) for vm in await _proxmox_api().list_cluster_vms()
+        if vm["status"] == "running" and captain_domain in vm["tags"]
+    }
+    missing = sorted(node["name"] for node in nodes if (node["name"], node["node"], node["vmid"]) not in running)
+    if missing:
+        await asyncio.to_thread(result_store.forget, "k3d-lb", captain_domain)
+        raise HTTPException(status_code=404, detail=f"k3d-lb node(s) {missing} of the stored manifest are gone or not running; POST /v1/k3d-lb-nodes to recreate them.")
+    return manifest
+
+
+async def _delete_vm_with_retry(px: ProxmoxClient, vm: dict):
+    logger.info(f"Deleting k3d-lb node {vm['name']} (vmid {vm['vmid']} on {vm['node']})")
+    for attempt in range(3):
+        try:
+            await _scheduled(vm["node"], "delete_vm", lambda: px.delete_vm(vm["node"], vm["vmid"]))
+            return
+        except Exception as e:
+            # Concurrent destroys on one node can hit pmxcfs/flock contention;
+            # PVE already waited internally, so retry straight away.
+            if attempt < 2 and _is_transient_lock_timeout(e):
+                logger.warning(f"Delete of {vm['name']} hit a transient Proxmox lock timeout, retrying")
+                continue
+            raise
+
+
+async def _delete_vm_and_iso(px: ProxmoxClient, vm: dict):
+    """Delete vm, then its cloud-init ISO(s) (primary or hedge), which outlive the VM on ISO storage."""
+    await _delete_vm_with_retry(px, vm)
+    try:
+        await px.delete_isos_matching(re.escape(f"{CREATOR_TAG}-{vm['name']}") + r"(-hedge)?-cloudinit\.iso")
+    except Exception as e:
+        logger.warning(f"Could not delete the cloud-init ISO of {vm['name']} (left to the orphan sweep): {e}")
+
+
+async def _sweep_orphaned_isos(px: ProxmoxClient, captain_domain: str, skip_vm_names: list):
+    """Delete captain_domain's cloud-init ISOs left by earlier runs; never raises.
+
+    ISOs of the VMs named in skip_vm_names are left alone: they are being deleted
+    alongside by _delete_vm_and_iso, which removes each ISO once its VM is gone.
+    """
+    skip = "".join(f"(?!{re.escape(name)}(-hedge)?-cloudinit\\.iso)" for name in skip_vm_names)
+    try:
+        # The library skips any ISO still referenced by a VM config.
+        with metrics.timed("iso_sweep"):
+            deleted = await px.delete_isos_matching(rf"{CREATOR_TAG}-{skip}{re.escape(captain_domain)}-exit\d+(-hedge)?-cloudinit\.iso")
+        if deleted:
+            logger.info(f"Deleted {deleted} orphaned cloud-init ISO(s) for {captain_domain}")
+    except Exception as e:
+        logger.error(f"Orphaned ISO sweep failed for {captain_domain}: {e}")
+
+
+async def _set_placement_vmids(vms: list):
+    """Record each freshly built VM's vmid on its Waggle placement, concurrently."""
+    if not vms:
+        return
+    waggle = _waggle()
+
+    async def set_placement_vmid(vm):
+        with metrics.timed("waggle_set_placement_vmid", vm["node"]):
+            await waggle.set_placement_vmid(vm["placement_id"], int(vm["vmid"]))
+
+    await asyncio.gather(*(set_placement_vmid(vm) for vm in vms))
+
+
+async def _pools_to_rebase(captain_domain: str, kept: dict, cold_suffixes: list):
+    """(old domain pools, kept VMs to move into the new pool) for a reconcile.
+
+    Waggle pools can't be resized, so rather than stacking a new pool next to the
+    old one on every reconcile, the kept VMs from the domain pool are accounted
+    in the new pool too and the old pools are deleted once it is populated. Not
+    needed when the old pool already matches the kept VMs exactly and nothing
+    new is built. Kept VMs claimed from the warm pool keep their own pools.
+    """
+    old_pools = await _waggle().find_pools_by_name(_pool_name(captain_domain))
+    if not old_pools:
+        return [], []
+    rebased = [vm for vm in kept.values() if not any(tag.startswith(WARM_POOL_PREFIX) for tag in vm["tags"])]
+    if not cold_suffixes and len(old_pools) == 1:
+        placements = await _waggle().get_pool_placements(old_pools[0]["id"])
+        if sorted(str(p.get("vmid")) for p in placements) == sorted(str(vm["vmid"]) for vm in rebased):
+            return [], []
+    return old_pools, rebased
+
+
+def _assign_placements(placements: list, rebased: list) -> list:
+    """Give each rebased VM a placement, on its own hypervisor where possible; returns the rest."""
+    free = list(placements)
+    unmatched = []
+    for vm in rebased:
+        placement = next((p for p in free if p["hypervisor_name"] == vm["node"]), None)
+        if placement is None:
+            unmatched.append(vm)
+        else:
+            free.remove(placement)
+            vm["placement_id"] = placement["id"]
+    for vm in unmatched:
+        placement = free.pop(0)
+        logger.warning(f"Waggle placed kept k3d-lb node {vm['vm_name']} on {placement['hypervisor_name']}, but it runs on {vm['node']}")
+        vm["placement_id"] = placement["id"]
+    return free
+
+
+async def _replace_placements(vms: list, old_pools: list):
+    """Record vms' placements, then drop the pools they were moved out of."""
+    await _set_placement_vmids(vms)
+    await _delete_pools(old_pools)
+
+
+async def _find_pools(pool_names: list) -> list:
+    waggle = _waggle()
+    found = await asyncio.gather(*(waggle.find_pools_by_name(name) for name in pool_names))
+    return [pool for pools in found for pool in pools]
+
+
+async def _delete_pools(pools: list):
+    if not pools:
+        return
+    waggle = _waggle()
+    # Pools span hypervisors, so this one is labelled with the Waggle datacenter instead.
+    with metrics.timed("waggle_delete_pool", os.getenv("WAGGLE_DATACENTER_NAME", "")):
+        await asyncio.gather(*(waggle.delete_pool(pool["id"]) for pool in pools))
+
+
+async def _read_chisel_credentials(vm: dict):
+    """The --auth value of the chisel server running on vm, or None if it can't be read."""
+    script = (
+        "docker inspect --format '{{range .Args}}{{println .}}{{end}}' "
+        "$(docker ps -q --filter name=^chisel$; docker ps -q --filter ancestor=docker.io/jpillora/chisel:1) | grep '^--auth=' | head -n1\n"
+    )
+    try:
+        status = await _proxmox_api().agent_exec(vm["node"], vm["vmid"], ["/bin/sh", "-s"], input_data=script)
+    except Exception as e:
+        logger.warning(f"Could not read chisel credentials from {vm['vm_name']} (vmid {vm['vmid']}): {e}")
+        return None
+    out = status.get("out-data", "").strip()
+    if not out.startswith("--auth="):
+        return None
+    return out[len("--auth="):] or None
+
+
+async def _release_domain_pools_of(captain_domain: str, vmids: set):
+    """Delete the captain_domain Waggle pools whose placements all belong to removed VMs.
+
+    Waggle pools can't shrink, so a pool that still backs a kept VM stays here;
+    create_nodes then moves the kept VMs into its new pool (see _pools_to_rebase).
+    """
+    waggle = _waggle()
+    pools = await waggle.find_pools_by_name(_pool_name(captain_domain))
+    placements = await asyncio.gather(*(waggle.get_pool_placements(pool["id"]) for pool in pools))
+    releasable = []
+    for pool, pool_placements in zip(pools, placements):
+        if all(str(p.get("vmid")) in vmids for p in pool_placements):
+            releasable.append(pool)
+        else:
+            logger.info(f"Keeping Waggle pool {pool['id']} for {captain_domain}: it still backs kept VM(s)")
+    await _delete_pools(releasable)
+
+
+async def _reconcile_existing_locked(captain_domain: str, suffixes: list, rotate_credentials: bool):
+    """Diff the existing nodes against suffixes instead of replacing all of them.
+
+    Running VMs whose name matches a wanted suffix are kept; everything else
+    (stopped/errored, surplus, duplicates) is deleted along with its Waggle
+    placement where that can be released. Kept nodes keep their chisel
+    credentials unless rotate_credentials is set or they can't be read (or
+    disagree), in which case fresh ones are pushed to them in place.
+
+    Returns ({suffix: vm}, credentials, kept VMs whose cloud-init ISO may still be attached).
+    """
+    px = _proxmox()
+    api = _proxmox_api()
+    cleanup_cut_short = await _cancel_stale_cleanup(captain_domain)
+    await _await_hedge_teardowns(captain_domain)
+
+    wanted = {f"{captain_domain}-{suffix}": suffix for suffix in suffixes}
+    kept, doomed = {}, []
+    for vm in await api.list_cluster_vms():
+        if not {CREATOR_TAG, MANAGED_TAG, captain_domain} <= set(vm["tags"]):
+            continue
+        suffix = wanted.get(vm["name"])
+        if suffix and suffix not in kept and vm["status"] == "running":
+            kept[suffix] = {"vm_name": vm["name"], "node": vm["node"], "vmid": vm["vmid"], "iso_filename": _iso_filename(vm["name"]), "tags": vm["tags"]}
+        else:
+            doomed.append(vm)
+
+    if not kept:
+        logger.info(f"Nothing to keep for {captain_domain}; falling back to a full replace")
+        await _delete_nodes_locked(captain_domain)
+        return {}, util.chisel.generate_credentials(), []
+
+    credentials = None
+    if not rotate_credentials:
+        found = set(await asyncio.gather(*(_read_chisel_credentials(vm) for vm in kept.values())))
+        credentials = found.pop() if len(found) == 1 else None
+    if credentials is None:
+        credentials = util.chisel.generate_credentials()
+        logger.info(f"Rotating chisel credentials in place on {len(kept)} kept k3d-lb node(s) for {captain_domain}")
+        results = await asyncio.gather(
+            *(api.agent_exec(vm["node"], vm["vmid"], ["/bin/sh", "-s"], input_data=_chisel_start_script(credentials))
+              for vm in kept.values()),
+            return_exceptions=True,
+        )
+        for (suffix, vm), r in zip(list(kept.items()), results):
+            if isinstance(r, BaseException):
+                logger.warning(f"Credential push to {vm['vm_name']} (vmid {vm['vmid']}) failed: {r}; replacing it")
+                del kept[suffix]
+                doomed.append({"name": vm["vm_name"], "node": vm["node"], "vmid": vm["vmid"], "tags": vm["tags"]})
+
+    if doomed:
+        logger.info(f"Removing {len(doomed)} k3d-lb node(s) for {captain_domain}: {sorted(vm['name'] for vm in doomed)}")
+        warm_names = sorted({tag for vm in doomed for tag in vm["tags"] if tag.startswith(WARM_POOL_PREFIX)})
+        # Same overlap as _delete_nodes_locked; ISOs still attached to kept VMs are skipped by the sweep.
+        results, warm_pools, _ = await asyncio.gather(
+            asyncio.gather(*(_delete_vm_and_iso(px, vm) for vm in doomed), return_exceptions=True),
+            _find_pools(warm_names),
+            _sweep_orphaned_isos(px, captain_domain, [vm["name"] for vm in doomed]),
+            return_exceptions=True,
+        )
+        failures = [f"{vm['name']} (vmid {vm['vmid']}): {r}" for vm, r in zip(doomed, results) if isinstance(r, BaseException)]
+        if failures:
+            raise HTTPException(status_code=500, detail=(
+                f"Error reconciling k3d-lb nodes for {captain_domain}: could not delete " + "; ".join(failures)
+                + ". Re-run POST /v1/k3d-lb-nodes, or DELETE /v1/k3d-lb-nodes to clean up."
+            ))
+        if isinstance(warm_pools, BaseException):
+            raise warm_pools
+        await asyncio.gather(
+            _release_domain_pools_of(captain_domain, {str(vm["vmid"]) for vm in doomed}),
+            _delete_pools(warm_pools),
+        )
+
+    logger.info(f"Keeping {len(kept)} healthy k3d-lb node(s) for {captain_domain}: {sorted(kept)}")
+    return kept, credentials, list(kept.values()) if cleanup_cut_short else []
 
 
 async def delete_nodes(captain_domain: str):
@@ -373,46 +1499,34 @@ async def delete_nodes(captain_domain: str):
 
 async def _delete_nodes_locked(captain_domain: str):
     logger.info(f"Starting deletion of existing k3d-lb nodes for captain_domain: {captain_domain}")
+    await asyncio.to_thread(result_store.forget, "k3d-lb", captain_domain)
     px = _proxmox()
-    waggle = _waggle()
 
     # A previous run's background cleanup may still be polling stale vmids and
     # would otherwise delete ISOs by (reused) filename after we recreate them.
     await _cancel_stale_cleanup(captain_domain)
+    await _await_hedge_teardowns(captain_domain)
 
     vms = await px.list_vms_by_tags([CREATOR_TAG, MANAGED_TAG, captain_domain])
-
-    async def delete_one(vm):
-        logger.info(f"Deleting k3d-lb node {vm['name']} (vmid {vm['vmid']} on {vm['node']})")
-        for attempt in range(3):
-            try:
-                await px.delete_vm(vm["node"], vm["vmid"])
-                return
-            except Exception as e:
-                # Concurrent destroys on one node can hit pmxcfs/flock contention;
-                # PVE already waited internally, so retry straight away.
-                if attempt < 2 and _is_transient_lock_timeout(e):
-                    logger.warning(f"Delete of {vm['name']} hit a transient Proxmox lock timeout, retrying")
-                    continue
-                raise
+    # VMs claimed from the warm pool carry their own one-placement Waggle pool.
+    warm_pool_names = await _warm_pool_names_of(vms) if vms else set()
 
     # Delete all VMs concurrently — sequential deletes cost the full stop+destroy
     # task round-trip per VM, which dominates the request for a full-width pool.
-    results = await asyncio.gather(*(delete_one(vm) for vm in vms), return_exceptions=True)
+    # The Waggle pool lookups and the sweep of ISOs left by earlier runs don't
+    # depend on the deletes, so they run alongside them.
+    results, pools, _ = await asyncio.gather(
+        asyncio.gather(*(_delete_vm_and_iso(px, vm) for vm in vms), return_exceptions=True),
+        _find_pools([_pool_name(captain_domain), *sorted(warm_pool_names)]),
+        _sweep_orphaned_isos(px, captain_domain, [vm["name"] for vm in vms]),
+        return_exceptions=True,
+    )
     failures = []
     for vm, r in zip(vms, results):
         if isinstance(r, BaseException):
             logger.error(f"Failed to delete k3d-lb node {vm['name']} (vmid {vm['vmid']} on {vm['node']}): {r}")
             failures.append(f"{vm['name']} (vmid {vm['vmid']} on {vm['node']}): {r}")
 
-    try:
-        # The library skips any ISO still referenced by a VM config.
-        deleted = await px.delete_isos_matching(rf"{CREATOR_TAG}-{re.escape(captain_domain)}-exit\d+-cloudinit\.iso")
-        if deleted:
-            logger.info(f"Deleted {deleted} orphaned cloud-init ISO(s) for {captain_domain}")
-    except Exception as e:
-        logger.error(f"Orphaned ISO sweep failed for {captain_domain}: {e}")
-
     if failures:
         # Keep the Waggle pool: the surviving VMs still consume real capacity, so
         # releasing their placements would let Waggle over-book the hypervisors.
@@ -422,8 +1536,285 @@ async def _delete_nodes_locked(captain_domain: str):
             + ". The Waggle pool was kept so capacity stays accounted; re-run DELETE /v1/k3d-lb-nodes after resolving."
         )
 
-    pools = await waggle.find_pools_by_name(_pool_name(captain_domain))
-    for pool in pools:
-        await waggle.delete_pool(pool["id"])
+    if isinstance(pools, BaseException):
+        raise pools
+    await _delete_pools(pools)
 
     logger.info(f"Completed deletion of {len(vms)} k3d-lb node(s) and {len(pools)} Waggle pool(s) for captain_domain: {captain_domain}")
+
+
+# ----------------------- Warm pool ----------------------- #
+
+# Claims mutate tags of shared warm VMs, so they are serialized under their own
+# lock (the per-domain lock doesn't cover two domains claiming the same VM).
+WARM_CLAIM_LOCK = "k3d-lb-warm-claims"
+# A replenish pass holds this for its whole run, builds included, so no worker
+# mistakes another worker's in-flight builds for abandoned ones.
+WARM_REPLENISH_LOCK = "k3d-lb-warm-replenish"
+_warm_pool_wakeup = asyncio.Event()
+# Names of warm VMs this process is still building; anything else that is warm
+# but not ready was abandoned (e.g. by a restart mid-build) and gets discarded.
+_warm_builds_in_flight = set()
+_background_tasks = []
+
+
+def _warm_pool_enabled() -> bool:
+    return WARM_POOL_SIZE > 0
+
+
+async def _warm_pool_names_of(vms: list) -> set:
+    vmids = {str(vm["vmid"]) for vm in vms}
+    return {
+        tag
+        for vm in await _proxmox_api().list_cluster_vms() if vm["vmid"] in vmids
+        for tag in vm["tags"] if tag.startswith(WARM_POOL_PREFIX)
+    }
+
+
+async def _list_warm_vms(ready_only: bool = False) -> list:
+    required = {CREATOR_TAG, MANAGED_TAG, WARM_TAG} | ({WARM_READY_TAG} if ready_only else set())
+    return [vm for vm in await _proxmox_api().list_cluster_vms() if required <= set(vm["tags"])]
+
+
+def _spread_by_node(vms: list, count: int) -> list:
+    """Pick count VMs round-robin across hypervisors so one node doesn't host them all."""
+    by_node = {}
+    for vm in sorted(vms, key=lambda v: (v["node"], v["name"])):
+        by_node.setdefault(vm["node"], []).append(vm)
+    picked = []
+    while len(picked) < count and any(by_node.values()):
+        for node in sorted(by_node):
+            if by_node[node] and len(picked) < count:
+                picked.append(by_node[node].pop(0))
+    return picked
+
+
+async def _discard_warm_vm(warm_name: str):
+    """Delete a warm VM (claimed or not), its cloud-init ISO, and its Waggle pool."""
+    px = _proxmox()
+    for vm in await px.list_vms_by_tags([CREATOR_TAG, MANAGED_TAG, warm_name]):
+        await px.delete_vm(vm["node"], vm["vmid"])
+    await px.delete_isos_matching(re.escape(_iso_filename(warm_name)))
+    await _delete_pools(await _find_pools([warm_name]))
+
+
+async def _claim_warm_vms(captain_domain: str, suffixes: list, credentials_for_chisel: str) -> dict:
+    """Hand ready warm VMs to captain_domain; returns {suffix: vm} for those claimed.
+
+    Claiming renames and re-tags the VM (so delete_nodes finds it by the
+    captain_domain tag) and then starts chisel with fresh credentials over the
+    guest agent. A VM whose credential push fails is discarded and its suffix is
+    left for the regular build path.
+    """
+    if not _warm_pool_enabled():
+        return {}
+    api = _proxmox_api()
+    claimed = {}
+    async with _named_lock(WARM_CLAIM_LOCK):
+        ready = [vm for vm in await _list_warm_vms(ready_only=True) if vm["status"] == "running"]
+        for vm, suffix in zip(_spread_by_node(ready, len(suffixes)), suffixes):
+            vm_name = f"{captain_domain}-{suffix}"
+            await api.set_vm_config(vm["node"], vm["vmid"], name=vm_name, tags=[CREATOR_TAG, MANAGED_TAG, captain_domain, vm["name"]])
+            claimed[suffix] = {"vm_name": vm_name, "node": vm["node"], "vmid": vm["vmid"], "iso_filename": None, "warm_name": vm["name"]}
+    if not claimed:
+        logger.info(f"No ready warm k3d-lb VMs for {captain_domain}; building all {len(suffixes)} node(s)")
+        return {}
+    _warm_pool_wakeup.set()
+
+    results = await asyncio.gather(
+        *(api.agent_exec(vm["node"], vm["vmid"], ["/bin/sh", "-s"], input_data=_chisel_start_script(credentials_for_chisel))
+          for vm in claimed.values()),
+        return_exceptions=True,
+    )
+    for (suffix, vm), r in zip(list(claimed.items()), results):
+        if isinstance(r, BaseException):
+            logger.warning(f"Pushing chisel credentials to warm VM {vm['warm_name']} (vmid {vm['vmid']}) failed: {r}; discarding it")
+            del claimed[suffix]
+            try:
+                await _discard_warm_vm(vm["warm_name"])
+            except Exception as e:
+                logger.error(f"Discarding warm VM {vm['warm_name']} failed: {e}")
+    logger.info(f"Claimed {len(claimed)} warm k3d-lb VM(s) for {captain_domain}: {sorted(vm['warm_name'] for vm in claimed.values())}")
+    return claimed
+
+
+async def _build_warm_vm(datacenter: dict, slot: dict, image: str, checksum, cache_name: str, user_data: bytes, create_attempts: int):
+    px = _proxmox()
+    waggle = _waggle()
+    warm_name = f"{WARM_POOL_PREFIX}{secrets.token_hex(4)}"
+    _warm_builds_in_flight.add(warm_name)
+    try:
+        pool = await waggle.create_pool(datacenter["id"], slot["id"], warm_name, 1)
+        placement = (await waggle.get_pool_placements(pool["id"]))[0]
+        node = placement["hypervisor_name"]
+        logger.info(f"Creating warm k3d-lb VM {warm_name} on hypervisor {node}")
+        cached_image = await _ensure_image_cached(node, image, checksum, cache_name)
+        tags = [CREATOR_TAG, MANAGED_TAG, WARM_TAG, warm_name]
+        vm = await _build_vm(px, node, warm_name, user_data, tags, slot, cached_image, create_attempts, cache_name)
+        await waggle.set_placement_vmid(placement["id"], int(vm["vmid"]))
+        try:
+            await px.wait_for_cloud_init(node, vm["vmid"])
+        except Exception as e:
+            logger.warning(f"Cloud-init wait failed for warm VM {warm_name} (vmid {vm['vmid']}): {e}; ejecting ISO anyway")
+        await px.eject_and_delete_iso(node, vm["vmid"], vm["iso_filename"])
+        await _proxmox_api().set_vm_config(node, vm["vmid"], tags=tags + [WARM_READY_TAG])
+        logger.info(f"Warm k3d-lb VM {warm_name} (vmid {vm['vmid']} on {node}) is ready")
+    except Exception:
+        try:
+            await _discard_warm_vm(warm_name)
+        except Exception as e:
+            logger.error(f"Cleaning up failed warm VM {warm_name} failed: {e}")
+        raise
+    finally:
+        _warm_builds_in_flight.discard(warm_name)
+
+
+async def _replenish_warm_pool_once():
+    # One replenisher at a time across workers, or each would top up the same shortfall.
+    async with _named_lock(WARM_REPLENISH_LOCK):
+        await _replenish_warm_pool_locked()
+
+
+async def _replenish_warm_pool_locked():
+    async with _named_lock(WARM_CLAIM_LOCK):
+        warm = await _list_warm_vms()
+    abandoned = [vm for vm in warm if WARM_READY_TAG not in vm["tags"] and vm["name"] not in _warm_builds_in_flight]
+    for vm in abandoned:
+        logger.info(f"Discarding abandoned warm k3d-lb VM {vm['name']} (vmid {vm['vmid']})")
+        await _discard_warm_vm(vm["name"])
+    missing = WARM_POOL_SIZE - (len(warm) - len(abandoned))
+    if missing <= 0:
+        return
+
+    logger.info(f"Warm k3d-lb pool is {missing} VM(s) below its target of {WARM_POOL_SIZE}; replenishing")
+    px = _proxmox()
+    (image, checksum, cache_name), datacenter, slot = await asyncio.gather(
+        _image_cache_key(px), _waggle_datacenter(), _waggle_slot()
+    )
+    user_data = _user_data().encode()
+    results = await asyncio.gather(
+        *(_build_warm_vm(datacenter, slot, image, checksum, cache_name, user_data, _create_attempts(missing)) for _ in range(missing)),
+        return_exceptions=True,
+    )
+    for r in results:
+        if isinstance(r, BaseException):
+            logger.error(f"Warm k3d-lb VM build failed: {r}")
+
+
+async def _warm_pool_replenisher():
+    """Keep WARM_POOL_SIZE ready VMs around; wakes on a claim or every WARM_POOL_INTERVAL seconds."""
+    while True:
+        # Cleared before the pass so a claim made while it runs triggers another.
+        _warm_pool_wakeup.clear()
+        try:
+            await _replenish_warm_pool_once()
+        except Exception as e:
+            logger.error(f"Warm k3d-lb pool replenish failed: {e}")
+        try:
+            await asyncio.wait_for(_warm_pool_wakeup.wait(), timeout=WARM_POOL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+# ----------------------- Image lifecycle ----------------------- #
+
+async def _forget_missing_images(nodes: list, cache_name: str, warmed: set):
+    """Drop from warmed the nodes whose storage no longer holds cache_name."""
+    api, storage = _proxmox_api(), os.environ["PROXMOX_STORAGE"]
+    nodes = [node for node in nodes if (node, cache_name) in warmed]
+    listings = await asyncio.gather(*(api.list_storage_volumes(node, storage, "import") for node in nodes), return_exceptions=True)
+    for node, volumes in zip(nodes, listings):
+        if isinstance(volumes, BaseException):
+            logger.warning(f"Could not list cached k3d-lb images on {node}: {volumes}")
+            continue
+        if not any(volume.endswith(f"/{cache_name}.qcow2") for volume in volumes):
+            logger.warning(f"k3d-lb image {cache_name} is no longer cached on {node}; caching it again")
+            warmed.discard((node, cache_name))
+
+
+async def _refresh_images_once(warmed: set):
+    """Pre-cache the current image on every online node, then prune stale releases.
+
+    warmed holds the (node, cache_name) pairs cached by an earlier pass; each is
+    checked against the node's storage again, so a volume deleted since (by hand,
+    or by another worker's prune) is cached again rather than trusted forever.
+    """
+    px = _proxmox()
+    # Past the metadata cache: a new release should be picked up on this pass,
+    # and the fresh checksum then serves create requests too.
+    image, checksum, cache_name = await _image_cache_key(px, refresh=True)
+    nodes = await _proxmox_api().list_online_nodes()
+    await _forget_missing_images(nodes, cache_name, warmed)
+    todo = [node for node in nodes if (node, cache_name) not in warmed]
+    if not todo:
+        return
+    logger.info(f"Pre-caching k3d-lb image {cache_name} on {len(todo)} node(s): {todo}")
+    results = await asyncio.gather(*(_ensure_image_cached(node, image, checksum, cache_name) for node in todo), return_exceptions=True)
+    for node, r in zip(todo, results):
+        if isinstance(r, BaseException):
+            logger.error(f"Pre-caching k3d-lb image {cache_name} on {node} failed: {r}")
+        else:
+            warmed.add((node, cache_name))
+    # Prune (cluster-wide) only once the release is cached on every online node;
+    # a node that failed above keeps its previous image until a later pass.
+    if all((node, cache_name) in warmed for node in nodes):
+        warmed.intersection_update({(node, cache_name) for node in nodes})
+        try:
+            pruned = await px.prune_import_images(rf"{re.escape(IMAGE_PREFIX)}.*\.qcow2", keep=cache_name)
+            if pruned:
+                logger.info(f"Pruned {pruned} stale k3d-lb image(s) from the import cache")
+        except Exception as e:
+            logger.warning(f"Stale image prune failed: {e}")
+        if LINKED_CLONES:
+            await _prune_templates(cache_name)
+
+
+async def _image_manager():
+    warmed = set()
+    while True:
+        try:
+            await _refresh_images_once(warmed)
+        except Exception as e:
+            logger.error(f"k3d-lb image refresh failed: {e}")
+        await asyncio.sleep(IMAGE_REFRESH_INTERVAL)
+
+
+def start_background_tasks():
+    """Called from the app lifespan; starts the optional k3d-lb background workers."""
+    if os.getenv("K3D_LB_LOCK_BACKEND", "memory").lower() != "memory":
+        if not TASK_QUEUE_PATH:
+            logger.warning(
+                "K3D_LB_LOCK_BACKEND is shared but K3D_LB_TASK_QUEUE_PATH is unset: a worker's background ISO cleanup "
+                "can't be cancelled by another worker's create/delete and may delete its new ISOs. Set "
+                "K3D_LB_TASK_QUEUE_PATH on the same shared volume before running more than one worker."
+            )
+        if HEDGE_PERCENTILE > 0:
+            logger.warning(
+                "K3D_LB_LOCK_BACKEND is shared but hedged builds are on: a losing hedge is torn down by the worker "
+                "that started it, unseen by the others. Set K3D_LB_HEDGE_PERCENTILE=0 when running more than one worker."
+            )
+    if _warm_pool_enabled():
+        logger.info(f"Starting warm k3d-lb pool replenisher (target {WARM_POOL_SIZE} VM(s))")
+        _background_tasks.append(asyncio.create_task(_warm_pool_replenisher()))
+    if IMAGE_REFRESH_INTERVAL > 0:
+        logger.info(f"Starting k3d-lb image manager (every {IMAGE_REFRESH_INTERVAL:.0f}s)")
+        _background_tasks.append(asyncio.create_task(_image_manager()))
+    if TASK_QUEUE_PATH:
+        global _task_queue
+        logger.info(f"Starting durable k3d-lb cleanup queue at {TASK_QUEUE_PATH}")
+        _task_queue = TaskQueue(TASK_QUEUE_PATH, {"finalize_cleanup": _run_queued_cleanup}, concurrency=TASK_QUEUE_CONCURRENCY)
+        _background_tasks.append(asyncio.create_task(_task_queue.run()))
+
+
+async def stop_background_tasks():
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    global _http_client, _iso_executor
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    if _iso_executor is not None:
+        _iso_executor.shutdown(wait=False)
+        _iso_executor = None
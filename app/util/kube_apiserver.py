@@ -1,6 +1,11 @@
 import ipaddress
+import os
 import re
 from fastapi import HTTPException
+import glueops.setup_logging
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = glueops.setup_logging.configure(level=LOG_LEVEL)
 
 # RFC 1123 DNS hostname (lowercase labels, dots). Positive allowlist beats a char blocklist.
 _HOSTNAME_RE = re.compile(
@@ -9,11 +14,41 @@ _HOSTNAME_RE = re.compile(
 
 
 def create_kube_apiserver_manifest(request):
+    return render_manifest(*parse_request(request))
+
+
+# Separators accepted between CIDRs in the array (and allowlist-file) form: commas and/or any
+# whitespace, with # comments ignored, so a JSON array and a one-CIDR-per-line file parse the same
+# way. A plain string keeps its original comma-separated meaning.
+_CIDR_SEPARATOR_RE = re.compile(r'[,\s]+')
+_COMMENT_RE = re.compile(r'#.*')
+
+
+def _split_ranges(allowed_source_ranges):
+    if isinstance(allowed_source_ranges, str):
+        return [c.strip() for c in allowed_source_ranges.split(',') if c.strip()]
+    return [c for item in allowed_source_ranges for c in _CIDR_SEPARATOR_RE.split(_COMMENT_RE.sub('', item)) if c]
+
+
+def aggregate_networks(networks):
+    """Collapse overlapping and adjacent networks into the minimal covering set, per address family."""
+    collapsed = []
+    for version in (4, 6):
+        collapsed.extend(ipaddress.collapse_addresses(n for n in networks if n.version == version))
+    return collapsed
+
+
+def parse_request(request):
+    """Validate and normalize a KubeApiserverManifestRequest into (captain_domain, cidrs, input_count).
+
+    input_count is the number of CIDRs supplied when request.aggregate is set (so the manifest can
+    report before/after counts), and None otherwise.
+    """
     captain_domain = request.captain_domain.strip()
     if not _HOSTNAME_RE.match(captain_domain):
         raise HTTPException(status_code=422, detail="Invalid captain_domain.")
 
-    raw = [c.strip() for c in request.allowed_source_ranges.split(',') if c.strip()]
+    raw = _split_ranges(request.allowed_source_ranges)
     if not raw:
         raise HTTPException(
             status_code=422,
@@ -29,16 +64,25 @@ def create_kube_apiserver_manifest(request):
         if net.prefixlen == 0:
             # 0.0.0.0/0 and ::/0 are an allow-all — refuse to emit an unrestricted apiserver.
             raise HTTPException(status_code=422, detail=f"Refusing allow-all CIDR: {cidr!r}")
-        normalized.append(str(net))
+        normalized.append(net)
+
+    if not request.aggregate:
+        # dedupe on normalized value while preserving order
+        return captain_domain, list(dict.fromkeys(str(n) for n in normalized)), None
+
+    aggregated = aggregate_networks(normalized)
+    for net in aggregated:
+        if net.prefixlen == 0:
+            # e.g. 0.0.0.0/1 + 128.0.0.0/1 — just as unrestricted as a literal /0.
+            raise HTTPException(status_code=422, detail=f"Refusing allowlist that aggregates to allow-all: {str(net)!r}")
+    logger.info(f"Aggregated kube-apiserver allowlist for {captain_domain}: {len(raw)} CIDR(s) -> {len(aggregated)}")
+    return captain_domain, [str(n) for n in aggregated], len(raw)
 
-    # dedupe on normalized value while preserving order
-    seen, cidrs = set(), []
-    for n in normalized:
-        if n not in seen:
-            seen.add(n)
-            cidrs.append(n)
 
+def render_manifest(captain_domain, cidrs, input_count=None):
     source_range = "\n".join(f'      - "{cidr}"' for cidr in cidrs)
+    if input_count is not None:
+        source_range = f"      # aggregated from {input_count} CIDR(s) to {len(cidrs)}\n{source_range}"
 
     manifest = f"""
 ---
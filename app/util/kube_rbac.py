@@ -10,19 +10,11 @@ _HOSTNAME_RE = re.compile(
 _GITHUB_ORG_RE = re.compile(r'^[a-zA-Z0-9](?:-?[a-zA-Z0-9]){0,38}$')
 
 
-def create_kube_rbac_manifest(request):
-    captain_domain = request.captain_domain.strip()
-    if not _HOSTNAME_RE.match(captain_domain):
-        raise HTTPException(status_code=422, detail="Invalid captain_domain.")
-
-    tenant_org = request.tenant_github_organization_name.strip()
-    if not _GITHUB_ORG_RE.match(tenant_org):
-        raise HTTPException(status_code=422, detail="Invalid tenant_github_organization_name.")
-
-    namespace = captain_domain.split('.')[0]          # environment_name (e.g. "nonprod")
-    group = f"oidc:{tenant_org}:{captain_domain}"      # append -reader / -reader-plus / -debugger / -operator
+# Only the four RoleBindings depend on the request (namespace + OIDC group); everything else is
+# identical for every tenant, so it is built once at import and each request renders just the bindings.
+ROLES = ("reader", "reader-plus", "debugger", "operator")
 
-    manifest = f"""# GlueOps developer-debug RBAC for kube-apiserver access (Lens / k9s).
+CLUSTER_ROLES_MANIFEST = """# GlueOps developer-debug RBAC for kube-apiserver access (Lens / k9s).
 # No aggregationRules (conflicts with ArgoCD) -- reader / reader-plus / debugger / operator each
 # repeat the read set; keep them in sync.
 
@@ -296,63 +288,25 @@ rules:
     verbs: ["delete", "deletecollection"]
 
 ---
-apiVersion: rbac.authorization.k8s.io/v1
-kind: RoleBinding
-metadata:
-  name: glueops-reader
-  namespace: "{namespace}"
-roleRef:
-  apiGroup: rbac.authorization.k8s.io
-  kind: ClusterRole
-  name: glueops-reader
-subjects:
-  - kind: Group
-    name: {group}-kubectl-reader
-    apiGroup: rbac.authorization.k8s.io
----
-apiVersion: rbac.authorization.k8s.io/v1
-kind: RoleBinding
-metadata:
-  name: glueops-reader-plus
-  namespace: "{namespace}"
-roleRef:
-  apiGroup: rbac.authorization.k8s.io
-  kind: ClusterRole
-  name: glueops-reader-plus
-subjects:
-  - kind: Group
-    name: {group}-kubectl-reader-plus
-    apiGroup: rbac.authorization.k8s.io
----
-apiVersion: rbac.authorization.k8s.io/v1
-kind: RoleBinding
-metadata:
-  name: glueops-debugger
-  namespace: "{namespace}"
-roleRef:
-  apiGroup: rbac.authorization.k8s.io
-  kind: ClusterRole
-  name: glueops-debugger
-subjects:
-  - kind: Group
-    name: {group}-kubectl-debugger
-    apiGroup: rbac.authorization.k8s.io
----
-apiVersion: rbac.authorization.k8s.io/v1
+"""
+
+_ROLE_BINDING_TEMPLATE = """apiVersion: rbac.authorization.k8s.io/v1
 kind: RoleBinding
 metadata:
-  name: glueops-operator
+  name: glueops-{role}
   namespace: "{namespace}"
 roleRef:
   apiGroup: rbac.authorization.k8s.io
   kind: ClusterRole
-  name: glueops-operator
+  name: glueops-{role}
 subjects:
   - kind: Group
-    name: {group}-kubectl-operator
+    name: {group}-kubectl-{role}
     apiGroup: rbac.authorization.k8s.io
 ---
-apiVersion: rbac.authorization.k8s.io/v1
+"""
+
+SUPER_ADMIN_BINDING_MANIFEST = """apiVersion: rbac.authorization.k8s.io/v1
 kind: ClusterRoleBinding
 metadata:
   name: glueops-super-admins
@@ -365,4 +319,30 @@ subjects:
     name: oidc:glueops-cluster-admins:super_admins
     apiGroup: rbac.authorization.k8s.io
 """
-    return manifest
+
+
+def render_role_bindings(namespace, group):
+    return "".join(_ROLE_BINDING_TEMPLATE.format(role=role, namespace=namespace, group=group) for role in ROLES)
+
+
+def create_kube_rbac_manifest(request):
+    return render_manifest(*parse_request(request))
+
+
+def render_manifest(namespace, group):
+    return CLUSTER_ROLES_MANIFEST + render_role_bindings(namespace, group) + SUPER_ADMIN_BINDING_MANIFEST
+
+
+def parse_request(request):
+    """Validate a KubeRbacManifestRequest and derive the RoleBinding (namespace, group)."""
+    captain_domain = request.captain_domain.strip()
+    if not _HOSTNAME_RE.match(captain_domain):
+        raise HTTPException(status_code=422, detail="Invalid captain_domain.")
+
+    tenant_org = request.tenant_github_organization_name.strip()
+    if not _GITHUB_ORG_RE.match(tenant_org):
+        raise HTTPException(status_code=422, detail="Invalid tenant_github_organization_name.")
+
+    namespace = captain_domain.split('.')[0]          # environment_name (e.g. "nonprod")
+    group = f"oidc:{tenant_org}:{captain_domain}"      # append -reader / -reader-plus / -debugger / -operator
+    return namespace, group
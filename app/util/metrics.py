@@ -0,0 +1,80 @@
+"""
+In-process phase timing.
+
+Each timed phase is recorded in a cumulative histogram labelled by phase and hypervisor, served
+in Prometheus text format by GET /metrics. The phases timed while handling a request are also
+summarized in its Server-Timing header: the longest duration per phase, since the same phase
+runs concurrently for several nodes.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+METRIC_NAME = "tools_api_phase_duration_seconds"
+BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# (phase, hypervisor) -> [per-bucket counts..., +Inf count, sum]
+_histograms = {}
+# phase -> longest duration (seconds) seen by the current request, when one is being timed.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def observe(phase: str, hypervisor: str, seconds: float):
+    histogram = _histograms.setdefault((phase, hypervisor or ""), [0] * (len(BUCKETS) + 2))
+    for i, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            histogram[i] += 1
+    histogram[-2] += 1
+    histogram[-1] += seconds
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[phase] = max(timings.get(phase, 0.0), seconds)
+
+
+@contextmanager
+def timed(phase: str, hypervisor: str = ""):
+    """Record the duration of the with-block (including one that raises) under phase/hypervisor."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(phase, hypervisor, time.monotonic() - started)
+
+
+def start_request() -> dict:
+    """Collect this request's phase timings; tasks spawned from here on share the dict."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def detached_context() -> contextvars.Context:
+    """A copy of the current context that records no request timings.
+
+    For tasks that outlive the request or are shared with other requests
+    (asyncio.create_task(coro, context=detached_context())), so their phases
+    don't land in whichever request happened to spawn them.
+    """
+    context = contextvars.copy_context()
+    context.run(_request_timings.set, None)
+    return context
+
+
+def server_timing(timings: dict) -> str:
+    return ", ".join(f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in sorted(timings.items()))
+
+
+def render_prometheus() -> str:
+    lines = [
+        f"# HELP {METRIC_NAME} Duration of provisioning phases, by hypervisor.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    for (phase, hypervisor), histogram in sorted(_histograms.items()):
+        labels = f'phase="{phase}",hypervisor="{hypervisor}"'
+        for bound, count in zip(BUCKETS, histogram):
+            lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {histogram[-2]}')
+        lines.append(f"{METRIC_NAME}_count{{{labels}}} {histogram[-2]}")
+        lines.append(f"{METRIC_NAME}_sum{{{labels}}} {histogram[-1]:.6f}")
+    return "\n".join(lines) + "\n"
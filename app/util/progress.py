@@ -0,0 +1,70 @@
+"""
+Opt-in streaming progress for long-running provisioning endpoints.
+
+The endpoint's work runs as a task that reports phase events through an `emit` callback; the
+response streams them as NDJSON (`application/x-ndjson`) or Server-Sent Events
+(`text/event-stream`) as they happen, and ends with either the final manifest or the error.
+Because the status line is sent with the first event, a failure after that point is reported
+only by the closing `error` event.
+"""
+
+import asyncio
+import json
+import time
+
+from fastapi import HTTPException
+
+_running = set()
+
+FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def requested_format(stream, accept):
+    """'ndjson' / 'sse' when the caller opted in via ?stream= or the Accept header, else None."""
+    if stream:
+        if stream not in FORMATS:
+            raise HTTPException(status_code=400, detail=f"stream must be one of: {', '.join(FORMATS)}")
+        return stream
+    for fmt, media_type in FORMATS.items():
+        if accept and media_type in accept:
+            return fmt
+    return None
+
+
+def _encode(fmt: str, event: dict) -> str:
+    data = json.dumps(event)
+    if fmt == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+async def stream(fmt: str, run):
+    """Yield encoded events while run(emit) executes, then its result as the 'manifest' event.
+
+    emit(dict) may be called from the event loop or from a worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    started = time.monotonic()
+
+    def emit(event: dict):
+        event = {"event": "phase", "elapsed": round(time.monotonic() - started, 3), **event}
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    # Kept referenced until done: if the client goes away mid-stream the provisioning
+    # still finishes, as a non-streaming request would, rather than stop half-built.
+    task = asyncio.create_task(run(emit))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    task.add_done_callback(lambda t: loop.call_soon_threadsafe(queue.put_nowait, None))
+    while True:
+        event = await queue.get()
+        if event is None:
+            break
+        yield _encode(fmt, event)
+    try:
+        yield _encode(fmt, {"event": "manifest", "manifest": task.result()})
+    except HTTPException as e:
+        yield _encode(fmt, {"event": "error", "status": e.status_code, "detail": e.detail})
+    except Exception as e:
+        yield _encode(fmt, {"event": "error", "status": 500, "detail": str(e)})
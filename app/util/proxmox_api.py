@@ -0,0 +1,137 @@
+"""
+Thin async client for the Proxmox VE REST calls that glueops.proxmox.ProxmoxClient does not wrap
+(guest-agent exec and network info, VM status and config/tag updates, linked clones and
+templates, cluster-wide VM and node listing, storage content listing).
+
+Uses the same PROXMOX_* environment as k3d_lb's ProxmoxClient. Errors surface the same way the
+library's do: httpx.HTTPStatusError for API errors, RuntimeError('Proxmox task failed: ...') for
+failed worker tasks, so k3d_lb's retry classifiers apply unchanged.
+"""
+
+import asyncio
+import os
+import time
+
+import httpx
+
+
+class ProxmoxApi:
+    def __init__(self, host: str, token_id: str, token_secret: str, port: int = 8006, verify_ssl: bool = True):
+        self._client = httpx.AsyncClient(
+            base_url=f"https://{host}:{port}/api2/json",
+            headers={"Authorization": f"PVEAPIToken={token_id}={token_secret}"},
+            verify=verify_ssl,
+            timeout=60.0,
+        )
+
+    @classmethod
+    def from_env(cls) -> "ProxmoxApi":
+        return cls(
+            host=os.environ["PROXMOX_HOST"],
+            token_id=os.environ["PROXMOX_TOKEN_ID"],
+            token_secret=os.environ["PROXMOX_TOKEN_SECRET"],
+            port=int(os.getenv("PROXMOX_PORT", "8006")),
+            verify_ssl=os.getenv("PROXMOX_VERIFY_SSL", "true").lower() not in ("false", "0", "no"),
+        )
+
+    async def _request(self, method: str, path: str, **kwargs):
+        r = await self._client.request(method, path, **kwargs)
+        r.raise_for_status()
+        return r.json().get("data")
+
+    async def wait_task(self, node: str, upid: str, timeout: float = 600.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = await self._request("GET", f"/nodes/{node}/tasks/{upid}/status")
+            if status.get("status") == "stopped":
+                if status.get("exitstatus") != "OK":
+                    raise RuntimeError(f"Proxmox task failed: {status.get('exitstatus')}")
+                return
+            await asyncio.sleep(1.0)
+        raise TimeoutError(f"Proxmox task {upid} did not finish within {timeout:.0f}s")
+
+    async def list_cluster_vms(self) -> list:
+        """Every QEMU VM in the cluster with its node, name, status and tags (as a list)."""
+        vms = await self._request("GET", "/cluster/resources", params={"type": "vm"})
+        return [
+            {
+                "vmid": str(vm["vmid"]),
+                "node": vm.get("node"),
+                "name": vm.get("name", ""),
+                "status": vm.get("status"),
+                "template": bool(vm.get("template")),
+                "tags": [t for t in (vm.get("tags") or "").replace(",", ";").split(";") if t],
+            }
+            for vm in vms or []
+            if vm.get("type") == "qemu"
+        ]
+
+    async def list_cluster_vmids(self) -> set:
+        """Every vmid in use in the cluster, QEMU VMs and LXC containers alike (they share one namespace)."""
+        vms = await self._request("GET", "/cluster/resources", params={"type": "vm"})
+        return {int(vm["vmid"]) for vm in vms or []}
+
+    async def list_online_nodes(self) -> list:
+        nodes = await self._request("GET", "/nodes")
+        return sorted(n["node"] for n in nodes or [] if n.get("status") == "online")
+
+    async def list_storage_volumes(self, node: str, storage: str, content: str = None) -> list:
+        """Volume ids (e.g. 'local:import/<name>.qcow2') on node's storage, optionally of one content type."""
+        params = {"content": content} if content else {}
+        volumes = await self._request("GET", f"/nodes/{node}/storage/{storage}/content", params=params)
+        return [v["volid"] for v in volumes or []]
+
+    async def vm_status(self, node: str, vmid) -> str:
+        """'running', 'stopped', ... from the VM's current status."""
+        status = await self._request("GET", f"/nodes/{node}/qemu/{vmid}/status/current")
+        return status.get("status")
+
+    async def agent_network_interfaces(self, node: str, vmid) -> list:
+        """The guest agent's network-get-interfaces result; raises while the agent is not up."""
+        data = await self._request("GET", f"/nodes/{node}/qemu/{vmid}/agent/network-get-interfaces")
+        return (data or {}).get("result") or []
+
+    async def vm_config(self, node: str, vmid) -> dict:
+        return await self._request("GET", f"/nodes/{node}/qemu/{vmid}/config")
+
+    async def clone_vm(self, node: str, vmid, newid, name: str, full: bool = False, timeout: float = 600.0):
+        """Clone vmid to newid on the same node (a linked clone unless full) and wait for the task."""
+        upid = await self._request(
+            "POST", f"/nodes/{node}/qemu/{vmid}/clone",
+            data={"newid": newid, "name": name, "full": int(full)},
+        )
+        await self.wait_task(node, upid, timeout=timeout)
+
+    async def convert_to_template(self, node: str, vmid, timeout: float = 600.0):
+        upid = await self._request("POST", f"/nodes/{node}/qemu/{vmid}/template")
+        if upid:
+            await self.wait_task(node, upid, timeout=timeout)
+
+    async def set_vm_config(self, node: str, vmid, **params):
+        """Synchronous config update (name, tags, ...); tags are passed as a list."""
+        if "tags" in params:
+            params["tags"] = ";".join(params["tags"])
+        await self._request("PUT", f"/nodes/{node}/qemu/{vmid}/config", data=params)
+
+    async def agent_exec(self, node: str, vmid, command: list, input_data: str = None, timeout: float = 120.0) -> dict:
+        """Run a command through the QEMU guest agent and wait for it to exit.
+
+        Returns the exec-status payload ({'exitcode', 'out-data', 'err-data', ...}); raises
+        RuntimeError on a non-zero exit code.
+        """
+        data = {"command": command}
+        if input_data is not None:
+            data["input-data"] = input_data
+        started = await self._request("POST", f"/nodes/{node}/qemu/{vmid}/agent/exec", data=data)
+        pid = started["pid"]
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = await self._request("GET", f"/nodes/{node}/qemu/{vmid}/agent/exec-status", params={"pid": pid})
+            if status.get("exited"):
+                if status.get("exitcode", 0) != 0:
+                    raise RuntimeError(
+                        f"Guest command on vmid {vmid} exited {status.get('exitcode')}: {status.get('err-data', '').strip()}"
+                    )
+                return status
+            await asyncio.sleep(1.0)
+        raise TimeoutError(f"Guest command on vmid {vmid} did not exit within {timeout:.0f}s")
@@ -0,0 +1,75 @@
+"""
+Bounded concurrency for Proxmox VM operations (create, clone, resize, start, delete).
+
+Every operation holds one slot on its hypervisor and one on its storage for as long as it runs.
+Limits are additive-increase/multiplicative-decrease when adaptive: an operation that failed on
+pmxcfs/flock contention halves the limit of the node and storage it ran on, and each run of
+`limit` clean operations raises it by one again, up to the configured maximum. A maximum of 0
+means unlimited.
+"""
+
+import asyncio
+
+
+class AdaptiveLimiter:
+    def __init__(self, maximum: int, adaptive: bool = True):
+        self.maximum = maximum
+        self.limit = maximum
+        self.active = 0
+        self._adaptive = adaptive
+        self._clean = 0
+        self._changed = asyncio.Event()
+
+    async def acquire(self):
+        while self.active >= self.limit:
+            await self._changed.wait()
+        self.active += 1
+
+    def release(self, contended: bool = False):
+        self.active -= 1
+        if self._adaptive:
+            if contended:
+                self.limit = max(1, self.limit // 2)
+                self._clean = 0
+            elif self.limit < self.maximum:
+                self._clean += 1
+                if self._clean >= self.limit:
+                    self.limit += 1
+                    self._clean = 0
+        # Wake every waiter; each re-checks the limit before taking a slot.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class ProxmoxScheduler:
+    def __init__(self, per_node: int, per_storage: int, adaptive: bool, is_contention):
+        self._per_node = per_node
+        self._per_storage = per_storage
+        self._adaptive = adaptive
+        self._is_contention = is_contention
+        self._nodes = {}
+        self._storages = {}
+
+    def _limiters(self, node: str, storage):
+        limiters = []
+        if self._per_node > 0:
+            limiters.append(self._nodes.setdefault(node, AdaptiveLimiter(self._per_node, self._adaptive)))
+        if self._per_storage > 0 and storage:
+            limiters.append(self._storages.setdefault(storage, AdaptiveLimiter(self._per_storage, self._adaptive)))
+        return limiters
+
+    async def run(self, node: str, storage, operation):
+        """Await operation() once a slot is free on both node and storage."""
+        held = []
+        contended = False
+        try:
+            for limiter in self._limiters(node, storage):
+                await limiter.acquire()
+                held.append(limiter)
+            return await operation()
+        except Exception as e:
+            contended = bool(held) and self._is_contention(e)
+            raise
+        finally:
+            for limiter in held:
+                limiter.release(contended)
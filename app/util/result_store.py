@@ -0,0 +1,110 @@
+"""
+Encrypted local store of the last chisel manifest generated per captain_domain.
+
+POST /v1/chisel and /v1/k3d-lb-nodes save their manifest here, together with the nodes it
+points at; GET on the same paths returns it again after checking that those nodes still exist,
+so a lost manifest doesn't cost a full destroy-and-rebuild. A DELETE (or the delete step of the
+next POST) drops the entry.
+
+Enabled by RESULT_STORE_PATH (a SQLite file, on a persistent volume to survive restarts) and
+RESULT_STORE_KEY (a Fernet key, e.g. from `Fernet.generate_key()`). The manifest carries the
+chisel credentials and is encrypted at rest; the node list used for the existence check is not.
+Store failures are logged and never fail the provisioning request itself.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import glueops.setup_logging
+from cryptography.fernet import Fernet, InvalidToken
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = glueops.setup_logging.configure(level=LOG_LEVEL)
+
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", "")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    kind TEXT NOT NULL,
+    captain_domain TEXT NOT NULL,
+    manifest BLOB NOT NULL,
+    nodes TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (kind, captain_domain)
+)
+"""
+
+_db = None
+_fernet = None
+# The chisel endpoints run in worker threads, so the shared connection is guarded.
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(RESULT_STORE_PATH)
+
+
+def _domain(captain_domain: str) -> str:
+    # Callers differ in how they normalize (k3d-lb lowercases, chisel doesn't), so entries are
+    # keyed on one canonical form.
+    return captain_domain.strip().lower()
+
+
+def _connection() -> sqlite3.Connection:
+    global _db, _fernet
+    if _db is None:
+        key = os.getenv("RESULT_STORE_KEY")
+        if not key:
+            raise RuntimeError("RESULT_STORE_PATH is set but RESULT_STORE_KEY is not")
+        _fernet = Fernet(key)
+        _db = sqlite3.connect(RESULT_STORE_PATH, isolation_level=None, check_same_thread=False)
+        _db.execute(_SCHEMA)
+    return _db
+
+
+def save(kind: str, captain_domain: str, manifest: str, nodes: list):
+    """Keep manifest (and the nodes it points at) as captain_domain's latest kind result."""
+    if not enabled():
+        return
+    try:
+        with _lock:
+            db = _connection()
+            db.execute(
+                "INSERT OR REPLACE INTO results (kind, captain_domain, manifest, nodes, created) VALUES (?, ?, ?, ?, ?)",
+                (kind, _domain(captain_domain), _fernet.encrypt(manifest.encode()), json.dumps(nodes), time.time()),
+            )
+    except Exception as e:
+        logger.error(f"Could not save the {kind} manifest for {captain_domain}: {e}")
+
+
+def load(kind: str, captain_domain: str):
+    """(manifest, nodes) last saved for captain_domain, or None."""
+    if not enabled():
+        return None
+    with _lock:
+        db = _connection()
+        row = db.execute(
+            "SELECT manifest, nodes FROM results WHERE kind = ? AND captain_domain = ?", (kind, _domain(captain_domain))
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return _fernet.decrypt(row[0]).decode(), json.loads(row[1])
+        except InvalidToken:
+            # Saved under a previous RESULT_STORE_KEY; unreadable for good.
+            logger.warning(f"Dropping the stored {kind} manifest for {captain_domain}: it can't be decrypted with RESULT_STORE_KEY")
+            db.execute("DELETE FROM results WHERE kind = ? AND captain_domain = ?", (kind, _domain(captain_domain)))
+            return None
+
+
+def forget(kind: str, captain_domain: str):
+    if not enabled():
+        return
+    try:
+        with _lock:
+            _connection().execute("DELETE FROM results WHERE kind = ? AND captain_domain = ?", (kind, _domain(captain_domain)))
+    except Exception as e:
+        logger.error(f"Could not drop the stored {kind} manifest for {captain_domain}: {e}")
@@ -0,0 +1,102 @@
+"""
+Single-flight coalescing and Idempotency-Key handling for the destructive provisioning endpoints.
+
+A client that times out and retries POST /v1/k3d-lb-nodes, /v1/chisel or /v1/storage-buckets
+would otherwise start a second destroy-and-recreate and throw away the first one's result.
+Instead:
+
+- An identical request (same endpoint and canonical body) made while one is in flight attaches
+  to the running operation and gets its result; the result is then served to identical requests
+  for SINGLE_FLIGHT_RESULT_TTL seconds. This holds with or without an Idempotency-Key.
+- An Idempotency-Key additionally keeps the result of the first request made with it for
+  IDEMPOTENCY_KEY_TTL seconds, for retries with that key; reusing a key with a different body is
+  rejected with 422.
+
+Only successful results are kept, so a retry after a failure runs again. A DELETE for the same
+captain_domain drops the endpoint's entries (forget), so a later create never returns a manifest
+for nodes that no longer exist. State is per process.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import glueops.setup_logging
+from fastapi import HTTPException
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = glueops.setup_logging.configure(level=LOG_LEVEL)
+
+SINGLE_FLIGHT_RESULT_TTL = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "30"))
+IDEMPOTENCY_KEY_TTL = float(os.getenv("IDEMPOTENCY_KEY_TTL", "3600"))
+
+# (endpoint, "body", body fingerprint) | (endpoint, "key", idempotency key) ->
+# {"scope", "fingerprint", "task", "expires"}; expires is None while in flight. A keyed
+# request's entries share the task with the body entry it coalesced on.
+_entries = {}
+
+
+def _fingerprint(endpoint: str, request) -> str:
+    payload = json.dumps([endpoint, request.model_dump(mode="json")], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _purge_expired():
+    now = time.monotonic()
+    for key in [k for k, e in _entries.items() if e["expires"] is not None and e["expires"] <= now]:
+        del _entries[key]
+
+
+def _track(key, task: asyncio.Task, fingerprint: str, scope: str, ttl: float):
+    """Serve task's result under key until ttl seconds after it succeeds."""
+    entry = {"scope": scope, "fingerprint": fingerprint, "task": task, "expires": None}
+    _entries[key] = entry
+
+    def _settled(t):
+        if _entries.get(key) is not entry:
+            return
+        if t.cancelled() or t.exception() is not None or ttl <= 0:
+            del _entries[key]
+        else:
+            entry["expires"] = time.monotonic() + ttl
+
+    task.add_done_callback(_settled)
+
+
+async def run(endpoint: str, request, idempotency_key, operation):
+    """Await operation() for request, or the result of an identical/same-key call.
+
+    request is the endpoint's pydantic body and must have a captain_domain.
+    """
+    _purge_expired()
+    fingerprint = _fingerprint(endpoint, request)
+    scope = request.captain_domain.strip().lower()
+    key_entry = (endpoint, "key", idempotency_key) if idempotency_key else None
+
+    entry = _entries.get(key_entry) if key_entry else None
+    if entry is not None and entry["fingerprint"] != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body.")
+    if entry is None:
+        entry = _entries.get((endpoint, "body", fingerprint))
+
+    if entry is not None:
+        state = "in flight" if entry["expires"] is None else "completed"
+        logger.info(f"Returning the result of the {state} {endpoint} request for captain_domain: {entry['scope']}")
+        task = entry["task"]
+    else:
+        # Shielded: the operation finishes (for the attached requests, and so nothing is
+        # left half-built) even if the request that started it goes away.
+        task = asyncio.create_task(operation())
+        _track((endpoint, "body", fingerprint), task, fingerprint, scope, SINGLE_FLIGHT_RESULT_TTL)
+    if key_entry and key_entry not in _entries:
+        _track(key_entry, task, fingerprint, scope, IDEMPOTENCY_KEY_TTL)
+    return await asyncio.shield(task)
+
+
+def forget(endpoint: str, captain_domain: str):
+    """Drop endpoint's in-flight and cached entries for captain_domain (after a DELETE)."""
+    scope = captain_domain.strip().lower()
+    for key in [k for k, e in _entries.items() if k[0] == endpoint and e["scope"] == scope]:
+        del _entries[key]
@@ -252,12 +252,19 @@ def create_bucket(client, bucket_name):
         logger.info(f"Error creating bucket '{full_bucket_name}': {e}")
         raise
 
-def create_all_buckets(captain_domain):
+def delete_all_buckets(captain_domain, client=None):
     """
-    Manages buckets by deleting existing ones containing the base name and creating a new unique bucket.
+    Deletes the existing buckets containing the base name of the captain_domain.
+    
+    Args:
+        captain_domain (str): The captain_domain whose buckets should be retired.
+        client (Minio, optional): The MinIO client instance; a new one is created if omitted.
+    
+    Returns:
+        list: The names of the deleted buckets.
     """
-    # Initialize MinIO client
-    client = initialize_minio_client()
+    if client is None:
+        client = initialize_minio_client()
     
     # List all buckets
     logger.info("Listing all existing buckets...")
@@ -274,6 +281,17 @@ def create_all_buckets(captain_domain):
             delete_bucket(client, bucket_name)
     else:
         logger.info(f"No existing buckets contain the base name '{base_bucket_name}'.")
+    return matching_buckets
+
+def create_all_buckets(captain_domain):
+    """
+    Manages buckets by deleting existing ones containing the base name and creating a new unique bucket.
+    """
+    # Initialize MinIO client
+    client = initialize_minio_client()
+    
+    delete_all_buckets(captain_domain, client)
+    base_bucket_name = make_compliant_name(captain_domain)
     
     # Generate a unique bucket name
     unique_bucket_name = generate_unique_bucket_name(base_bucket_name)
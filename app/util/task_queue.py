@@ -0,0 +1,239 @@
+"""
+Small durable task queue on a local SQLite file.
+
+Work is recorded before it runs and removed once it succeeds, so tasks that were pending or
+running when the process stopped are picked up again. Each task has a kind (which selects its
+async handler), a key (tasks with the same key supersede each other) and a JSON payload. At most
+`concurrency` tasks run at once per worker; a failed task is retried with exponential backoff up
+to `max_attempts` times.
+
+Several workers (processes) may share one file. A worker claims a task by writing its owner id
+into the row inside an immediate transaction, and renews a heartbeat on its rows while they run;
+a row whose heartbeat is older than `lease` seconds belonged to a worker that died and is claimed
+again by any live one. Superseding a task running in another worker flags its row: the owner
+cancels the task at its next heartbeat and deletes the row, and supersede() waits for that.
+SQLite calls run in a worker thread, off the event loop.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import glueops.setup_logging
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = glueops.setup_logging.configure(level=LOG_LEVEL)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL,
+    owner TEXT,
+    heartbeat REAL,
+    superseded INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+class TaskQueue:
+    def __init__(self, path: str, handlers: dict, concurrency: int = 4, max_attempts: int = 5, poll_interval: float = 5.0, lease: float = 30.0):
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        # One connection shared by the worker threads.
+        self._lock = threading.Lock()
+        self._handlers = handlers
+        self._concurrency = concurrency
+        self._max_attempts = max_attempts
+        self._poll_interval = poll_interval
+        self._lease = lease
+        self._heartbeat_interval = min(poll_interval, lease / 10)
+        self._owner = uuid.uuid4().hex
+        self._wakeup = asyncio.Event()
+        # task id -> (key, asyncio task)
+        self._running = {}
+        self._superseded = set()
+
+    # _execute, _transaction and the helpers built on them block; the async
+    # methods run them in a worker thread through _call.
+
+    async def _call(self, method, *args):
+        return await asyncio.to_thread(method, *args)
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db.execute(sql, params)
+
+    def _transaction(self, work):
+        """work(db) inside BEGIN IMMEDIATE, so no other worker writes in between."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    async def enqueue(self, kind: str, key: str, payload: dict) -> int:
+        cursor = await self._call(
+            self._execute,
+            "INSERT INTO tasks (kind, key, payload, not_before) VALUES (?, ?, ?, ?)",
+            (kind, key, json.dumps(payload), time.time()),
+        )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def _drop(self, key: str):
+        """Delete key's rows nobody live is running; flag the rest. Returns (dropped, flagged)."""
+        def work(db):
+            stale = time.time() - self._lease
+            dropped = db.execute(
+                "DELETE FROM tasks WHERE key = ? AND (owner IS NULL OR owner = ? OR heartbeat < ?)",
+                (key, self._owner, stale),
+            ).rowcount
+            flagged = db.execute("UPDATE tasks SET superseded = 1 WHERE key = ?", (key,)).rowcount
+            return dropped, flagged
+
+        return self._transaction(work)
+
+    def _reap_superseded(self, key: str) -> int:
+        """Drop flagged rows whose owner died; returns how many flagged rows are left."""
+        def work(db):
+            db.execute("DELETE FROM tasks WHERE key = ? AND superseded = 1 AND heartbeat < ?", (key, time.time() - self._lease))
+            return db.execute("SELECT COUNT(*) FROM tasks WHERE key = ? AND superseded = 1", (key,)).fetchone()[0]
+
+        return self._transaction(work)
+
+    async def supersede(self, key: str) -> bool:
+        """Drop every task for key, cancelling any that is running; returns True if there were any.
+
+        A task running in another worker is cancelled by that worker; this waits until it
+        has stopped (or its worker's lease has run out).
+        """
+        dropped, flagged = await self._call(self._drop, key)
+        for task_key, task in self._running.values():
+            if task_key == key:
+                task.cancel()
+        if flagged:
+            logger.info(f"Waiting for another worker to cancel {flagged} superseded task(s) for {key}")
+        remaining = flagged
+        while remaining:
+            await asyncio.sleep(self._heartbeat_interval)
+            remaining = await self._call(self._reap_superseded, key)
+        return dropped + flagged > 0
+
+    def _claim(self, limit: int) -> list:
+        """Claim up to limit due tasks: unowned ones and those of workers whose lease ran out."""
+        def work(db):
+            now = time.time()
+            stale = now - self._lease
+            db.execute("DELETE FROM tasks WHERE superseded = 1 AND heartbeat < ?", (stale,))
+            rows = db.execute(
+                "SELECT id, kind, key, payload, attempts, owner FROM tasks"
+                " WHERE superseded = 0 AND ((owner IS NULL AND not_before <= ?) OR heartbeat < ?) ORDER BY id LIMIT ?",
+                (now, stale, limit),
+            ).fetchall()
+            for row in rows:
+                db.execute("UPDATE tasks SET owner = ?, heartbeat = ? WHERE id = ?", (self._owner, now, row[0]))
+            return rows
+
+        if limit <= 0:
+            return []
+        rows = self._transaction(work)
+        resumed = [row for row in rows if row[5] is not None]
+        if resumed:
+            logger.info(f"Resuming {len(resumed)} background task(s) interrupted in a worker that stopped")
+        return [row[:5] for row in rows]
+
+    def _heartbeat(self) -> tuple:
+        """Renew our rows; returns (ids we still own, ids among them flagged as superseded)."""
+        def work(db):
+            db.execute("UPDATE tasks SET heartbeat = ? WHERE owner = ?", (time.time(), self._owner))
+            rows = db.execute("SELECT id, superseded FROM tasks WHERE owner = ?", (self._owner,)).fetchall()
+            return {row[0] for row in rows}, {row[0] for row in rows if row[1]}
+
+        return self._transaction(work)
+
+    async def _tick(self):
+        owned, superseded = await self._call(self._heartbeat)
+        for task_id, (key, task) in list(self._running.items()):
+            if task.cancelling():
+                # Already on its way out; a second cancel would cut its row cleanup short.
+                continue
+            if task_id in superseded:
+                logger.info(f"Cancelling background task for {key}: superseded by another worker")
+                self._superseded.add(task_id)
+                task.cancel()
+            elif task_id not in owned:
+                # Superseded in this worker, or reclaimed by another after our lease lapsed.
+                task.cancel()
+        for row in await self._call(self._claim, self._concurrency - len(self._running)):
+            task = asyncio.create_task(self._run_one(*row))
+            self._running[row[0]] = (row[2], task)
+
+            def _done(t, task_id=row[0]):
+                self._running.pop(task_id, None)
+                self._wakeup.set()
+
+            task.add_done_callback(_done)
+
+    async def _run_one(self, task_id: int, kind: str, key: str, payload: str, attempts: int):
+        try:
+            await self._handlers[kind](json.loads(payload))
+        except asyncio.CancelledError:
+            # Superseded from another worker: its supersede() waits for the row to go.
+            # Superseded here: the row is gone already. Shutting down: the row is
+            # released (see run) and picked up again.
+            if task_id in self._superseded:
+                self._superseded.discard(task_id)
+                await self._call(self._execute, "DELETE FROM tasks WHERE id = ? AND owner = ?", (task_id, self._owner))
+            raise
+        except Exception as e:
+            attempts += 1
+            if attempts >= self._max_attempts:
+                logger.error(f"Task {kind} for {key} failed {attempts} time(s), giving up: {e}")
+                await self._call(self._execute, "DELETE FROM tasks WHERE id = ? AND owner = ?", (task_id, self._owner))
+            else:
+                delay = self._poll_interval * 2 ** attempts
+                logger.warning(f"Task {kind} for {key} failed ({e}); retrying in {delay:.0f}s")
+                await self._call(
+                    self._execute,
+                    "UPDATE tasks SET owner = NULL, heartbeat = NULL, attempts = ?, not_before = ? WHERE id = ? AND owner = ?",
+                    (attempts, time.time() + delay, task_id, self._owner),
+                )
+            return
+        await self._call(self._execute, "DELETE FROM tasks WHERE id = ? AND owner = ?", (task_id, self._owner))
+
+    async def run(self):
+        """Worker loop: claims due tasks (including those of stopped workers) and heartbeats its own."""
+        try:
+            while True:
+                self._wakeup.clear()
+                try:
+                    await self._tick()
+                except sqlite3.Error as e:
+                    logger.error(f"Background task queue poll failed: {e}")
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._heartbeat_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Cancelled at shutdown: release the rows of interrupted tasks so any
+            # live worker (or the next start) runs them again right away.
+            tasks = [task for _, task in self._running.values()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._call(
+                self._execute, "UPDATE tasks SET owner = NULL, heartbeat = NULL WHERE owner = ? AND superseded = 0", (self._owner,)
+            )
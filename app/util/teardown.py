@@ -0,0 +1,57 @@
+"""
+Full teardown of a dev environment per captain_domain.
+
+Runs the chisel (Hetzner) delete, the k3d-lb (Proxmox/Waggle) delete, the storage bucket
+retirement and the nuke-captain-domain-data GitHub workflow dispatch concurrently, so cleanup
+takes as long as the slowest provider rather than the sum of all of them. Every step runs to
+completion regardless of the others; the report lists each step's outcome.
+"""
+
+import asyncio
+import time
+
+from fastapi import HTTPException
+from util import domain_locks, storage, github, hetzner, k3d_lb, single_flight
+
+# step -> async callable(request) doing it; request has a captain_domain.
+STEPS = {
+    "chisel": lambda r: domain_locks.run_in_thread("chisel", r.captain_domain, hetzner.delete_existing_servers, r),
+    "k3d-lb-nodes": lambda r: k3d_lb.delete_nodes(r.captain_domain),
+    "storage-buckets": lambda r: domain_locks.run_in_thread("storage-buckets", r.captain_domain, storage.delete_all_buckets, r.captain_domain),
+    "captain-domain-data": lambda r: asyncio.to_thread(github.nuke_captain_domain_data_and_backups, r.captain_domain),
+}
+
+
+async def run(request, emit=None) -> dict:
+    """Run request.steps concurrently; returns the report (succeeded, and per-step status/result/error).
+
+    emit, if given, is called with {"node": step, "phase": status} as each step starts and ends.
+    """
+    # Drop coalesced/cached create results first, so a create racing the teardown
+    # starts afresh instead of returning a manifest for nodes about to be deleted.
+    for endpoint in ("chisel", "k3d-lb-nodes", "storage-buckets"):
+        single_flight.forget(endpoint, request.captain_domain)
+    steps = {name: {"status": "running", "result": None, "error": None, "duration_seconds": None} for name in request.steps}
+
+    async def execute(name):
+        entry = steps[name]
+        if emit is not None:
+            emit({"node": name, "phase": "running"})
+        started = time.monotonic()
+        try:
+            entry["result"] = await STEPS[name](request)
+            entry["status"] = "succeeded"
+        except HTTPException as e:
+            entry["status"], entry["error"] = "failed", {"status": e.status_code, "detail": e.detail}
+        except Exception as e:
+            entry["status"], entry["error"] = "failed", {"status": 500, "detail": str(e)}
+        entry["duration_seconds"] = round(time.monotonic() - started, 3)
+        if emit is not None:
+            emit({"node": name, "phase": entry["status"]})
+
+    await asyncio.gather(*(execute(name) for name in steps))
+    return {
+        "captain_domain": request.captain_domain,
+        "succeeded": all(entry["status"] == "succeeded" for entry in steps.values()),
+        "steps": steps,
+    }
@@ -0,0 +1,45 @@
+"""Microbenchmark for /v1/kube-rbac manifest generation.
+
+The ClusterRoles and the super-admin ClusterRoleBinding are built once at import,
+so a request should cost about the same as rendering the four RoleBindings alone,
+not the whole ~300-line document.
+
+Run from the repo root: python benchmarks/kube_rbac_bench.py
+"""
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from util import kube_rbac  # noqa: E402
+
+NUMBER = 20000
+
+request = SimpleNamespace(captain_domain="nonprod.foobar.onglueops.rocks", tenant_github_organization_name="development-tenant-foobar")
+namespace = "nonprod"
+group = f"oidc:{request.tenant_github_organization_name}:{request.captain_domain}"
+
+# What every request used to pay: formatting the whole document (static section included).
+full_template = (
+    kube_rbac.CLUSTER_ROLES_MANIFEST
+    + "".join(kube_rbac._ROLE_BINDING_TEMPLATE.replace("{role}", role) for role in kube_rbac.ROLES)
+    + kube_rbac.SUPER_ADMIN_BINDING_MANIFEST
+)
+assert full_template.format(namespace=namespace, group=group) == kube_rbac.create_kube_rbac_manifest(request)
+
+
+def per_call_us(stmt):
+    return min(timeit.repeat(stmt, number=NUMBER, repeat=5)) / NUMBER * 1e6
+
+
+bindings = per_call_us(lambda: kube_rbac.render_role_bindings(namespace, group))
+request_cost = per_call_us(lambda: kube_rbac.create_kube_rbac_manifest(request))
+whole_document = per_call_us(lambda: full_template.format(namespace=namespace, group=group))
+
+static = len(kube_rbac.CLUSTER_ROLES_MANIFEST) + len(kube_rbac.SUPER_ADMIN_BINDING_MANIFEST)
+print(f"document size:             {static} bytes static / {len(kube_rbac.render_role_bindings(namespace, group))} bytes per-request")
+print(f"render_role_bindings:      {bindings:.2f} us")
+print(f"create_kube_rbac_manifest: {request_cost:.2f} us ({request_cost / bindings:.2f}x bindings)")
+print(f"format whole document:     {whole_document:.2f} us ({whole_document / bindings:.2f}x bindings)")